@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest neighbour index over a DenseIndex's vectors.
+
+    Vectors are clustered around `nlist` k-means centroids; a query only scans the `nprobe`
+    lists whose centroids are closest, so nprobe trades recall for queries/sec at search
+    time. The index stores list membership only and reads the vectors themselves from the
+    DenseIndex memmap. Centroids live in `<path>.centroids.npy`; list membership is an
+    append-only `<path>.assign` log of (doc_id, list) pairs where list -1 is a tombstone.
+    Until enough vectors exist to train, search falls back to the exact DenseIndex scan.
+    """
+
+    def __init__(self, dense_index, path, nlist=256, nprobe=8, min_train_per_list=39):
+        self.dense = dense_index
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_per_list = min_train_per_list
+        self.centroids = None
+        self.lists = {}
+        self.assignments = {}
+        self.tombstones = 0
+        if os.path.exists(f"{path}.centroids.npy"):
+            self.centroids = np.load(f"{path}.centroids.npy")
+            self._replay()
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _replay(self):
+        if not os.path.exists(f"{self.path}.assign"):
+            return
+        log = np.fromfile(f"{self.path}.assign", dtype=np.int64)
+        log = log[:len(log) // 2 * 2].reshape(-1, 2)
+        for doc_id, list_id in log.tolist():
+            self._unassign(doc_id)
+            if list_id >= 0:
+                self._assign(doc_id, list_id)
+
+    def _assign(self, doc_id, list_id):
+        self.assignments[doc_id] = list_id
+        self.lists.setdefault(list_id, []).append(doc_id)
+
+    def _unassign(self, doc_id):
+        # Leaves the doc_id in its list; search skips it until the lists are compacted
+        if self.assignments.pop(doc_id, None) is not None:
+            self.tombstones += 1
+
+    def _log(self, pairs):
+        with open(f"{self.path}.assign", 'ab') as f:
+            f.write(np.array(pairs, dtype=np.int64).tobytes())
+
+    def _nearest_lists(self, vectors):
+        return (vectors @ self.centroids.T).argmax(axis=1)
+
+    def train(self, iterations=10, sample_size=100000, seed=0):
+        """Cluster the current vectors with spherical k-means and (re)assign every document."""
+        doc_ids = np.array(sorted(self.dense.rows), dtype=np.int64)
+        nlist = min(self.nlist, len(doc_ids))
+        if nlist == 0:
+            return
+        rng = np.random.default_rng(seed)
+        vectors = self._vectors(doc_ids)
+        sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            labels = (sample @ centroids.T).argmax(axis=1)
+            for list_id in range(nlist):
+                members = sample[labels == list_id]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1)
+        self.centroids = centroids.astype(np.float32)
+        np.save(f"{self.path}.centroids.npy", self.centroids)
+        self.lists = {}
+        self.assignments = {}
+        self.tombstones = 0
+        labels = self._nearest_lists(vectors)
+        for doc_id, list_id in zip(doc_ids.tolist(), labels.tolist()):
+            self._assign(doc_id, list_id)
+        tmp = f"{self.path}.assign.tmp"
+        np.stack([doc_ids, labels.astype(np.int64)], axis=1).tofile(tmp)
+        os.replace(tmp, f"{self.path}.assign")
+
+    def _vectors(self, doc_ids):
+        rows = np.array([self.dense.rows[doc_id] for doc_id in doc_ids], dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, self.dense.dim), dtype=np.float32)
+        vectors = self.dense.vectors
+        return vectors[rows].astype(np.float32) * self.dense.scales[rows, None]
+
+    def add(self, doc_id, vector):
+        if not self.trained:
+            if len(self.dense) >= self.nlist * self.min_train_per_list:
+                self.train()
+            return
+        self._unassign(doc_id)
+        list_id = int(self._nearest_lists(np.asarray(vector, dtype=np.float32)[None, :])[0])
+        self._assign(doc_id, list_id)
+        self._log([doc_id, list_id])
+
+    def add_many(self, doc_ids, vectors):
+        if not self.trained:
+            if len(self.dense) >= self.nlist * self.min_train_per_list:
+                self.train()
+            return
+        if not doc_ids:
+            return
+        labels = self._nearest_lists(np.asarray(vectors, dtype=np.float32))
+        for doc_id, list_id in zip(doc_ids, labels.tolist()):
+            self._unassign(doc_id)
+            self._assign(doc_id, list_id)
+        self._log(np.stack([np.array(doc_ids, dtype=np.int64), labels.astype(np.int64)], axis=1))
+
+    def remove(self, doc_id):
+        if doc_id in self.assignments:
+            self._unassign(doc_id)
+            self._log([doc_id, -1])
+        if self.tombstones > len(self.assignments):
+            self.compact()
+
+    def sync(self):
+        """Assign any vectors the DenseIndex holds that this index has not seen yet."""
+        if not self.trained:
+            if len(self.dense) >= self.nlist * self.min_train_per_list:
+                self.train()
+            return
+        missing = [doc_id for doc_id in self.dense.rows if doc_id not in self.assignments]
+        stale = [doc_id for doc_id in self.assignments if doc_id not in self.dense.rows]
+        for doc_id in stale:
+            self.remove(doc_id)
+        if missing:
+            labels = self._nearest_lists(self._vectors(missing))
+            for doc_id, list_id in zip(missing, labels.tolist()):
+                self._assign(doc_id, list_id)
+            self._log(np.stack([np.array(missing, dtype=np.int64), labels.astype(np.int64)], axis=1))
+
+    def compact(self):
+        self.lists = {}
+        for doc_id, list_id in self.assignments.items():
+            self.lists.setdefault(list_id, []).append(doc_id)
+        self.tombstones = 0
+        pairs = np.array(list(self.assignments.items()), dtype=np.int64).reshape(-1, 2)
+        tmp = f"{self.path}.assign.tmp"
+        pairs.tofile(tmp)
+        os.replace(tmp, f"{self.path}.assign")
+
+    def search(self, query_vector, k=10, nprobe=None):
+        """Approximate top-k (doc_id, cosine) pairs scanning the `nprobe` closest lists."""
+        if not self.trained:
+            return self.dense.search(query_vector, k)
+        query = np.asarray(query_vector, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidates = list(dict.fromkeys(
+            doc_id for list_id in probe.tolist() for doc_id in self.lists.get(list_id, ())
+            if self.assignments.get(doc_id) == list_id and doc_id in self.dense.rows))
+        if not candidates:
+            return []
+        scores = self._vectors(candidates) @ query
+        if len(scores) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+        else:
+            part = np.arange(len(scores))
+        order = part[np.argsort(-scores[part], kind='stable')]
+        return [(candidates[i], float(scores[i])) for i in order]
@@ -0,0 +1,423 @@
+import argparse
+import random
+import time
+
+from search_index import InvertedIndex, FuzzyCandidateIndex
+
+# Benchmarks run on a synthetic corpus so they need neither documents.json nor NLTK data:
+# documents are space-separated words drawn from a Zipf-like vocabulary, and every query
+# is a handful of words sampled from one "target" document, which is the relevant answer.
+
+def make_vocabulary(size, seed=0):
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocab = set()
+    while len(vocab) < size:
+        vocab.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(vocab)
+
+def make_corpus(num_docs, doc_length=150, vocab_size=5000, seed=0):
+    rng = random.Random(seed)
+    vocab = make_vocabulary(vocab_size, seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    return [' '.join(rng.choices(vocab, weights, k=doc_length)) for _ in range(num_docs)]
+
+def make_queries(corpus, num_queries, terms_per_query=3, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(num_queries):
+        target = rng.randrange(len(corpus))
+        words = sorted(set(corpus[target].split()))
+        queries.append((' '.join(rng.sample(words, min(terms_per_query, len(words)))), target))
+    return queries
+
+def overlap_search(corpus, query, k):
+    """Baseline from mini_rag.get_relevant_docs: re-tokenize every document per query."""
+    tokens = query.split()
+    scored = []
+    for doc_id, text in enumerate(corpus):
+        doc_tokens = text.split()
+        relevance = sum(token in doc_tokens for token in tokens)
+        if relevance > 0:
+            scored.append((doc_id, relevance))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [doc_id for doc_id, _ in scored[:k]]
+
+def fuzzy_search(corpus, query, k, threshold=70):
+    """Baseline from document_manager.advanced_search."""
+    from fuzzywuzzy import fuzz
+    query_tokens = set(query.split())
+    scored = []
+    for doc_id, text in enumerate(corpus):
+        similarity = fuzz.token_set_ratio(query_tokens, set(text.split()))
+        if similarity >= threshold:
+            scored.append((doc_id, similarity))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [doc_id for doc_id, _ in scored[:k]]
+
+def build_index(corpus):
+    index = InvertedIndex()
+    for doc_id, text in enumerate(corpus):
+        index.add(doc_id, text.split())
+    return index
+
+def evaluate(name, search, queries, k):
+    hits = 0
+    reciprocal_ranks = 0.0
+    start = time.perf_counter()
+    for query, target in queries:
+        results = search(query, k)
+        if target in results:
+            hits += 1
+            reciprocal_ranks += 1 / (results.index(target) + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed / len(queries) * 1000:>10.2f} ms/query"
+          f"   hit@{k}: {hits / len(queries):.3f}   MRR: {reciprocal_ranks / len(queries):.3f}")
+
+def bench_ranking(args):
+    corpus = make_corpus(args.docs)
+    queries = make_queries(corpus, args.queries)
+    start = time.perf_counter()
+    index = build_index(corpus)
+    print(f"Corpus: {args.docs} docs, BM25 index built in {time.perf_counter() - start:.2f}s")
+    evaluate('overlap', lambda q, k: overlap_search(corpus, q, k), queries, args.k)
+    if not args.skip_fuzzy:
+        evaluate('fuzzy', lambda q, k: fuzzy_search(corpus, q, k), queries, args.k)
+    evaluate('bm25', lambda q, k: [doc_id for doc_id, _ in index.bm25(q.split(), k)], queries, args.k)
+
+def bench_topk(args):
+    corpus = make_corpus(args.docs)
+    queries = [query.split() for query, _ in make_queries(corpus, args.queries, args.terms)]
+    index = build_index(corpus)
+    start = time.perf_counter()
+    exhaustive = [index.bm25(query, args.k) for query in queries]
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    pruned = [index.bm25_topk(query, args.k) for query in queries]
+    elapsed = time.perf_counter() - start
+    scored = sum(stats['scored'] for _, stats in pruned)
+    skipped = sum(stats['skipped'] for _, stats in pruned)
+    candidates = sum(stats['candidates'] for _, stats in pruned)
+    mismatches = sum([doc_id for doc_id, _ in a] != [doc_id for doc_id, _ in b]
+                     for a, (b, _) in zip(exhaustive, pruned))
+    print(f"Corpus: {args.docs} docs, {args.queries} queries of {args.terms} terms, k={args.k}")
+    print(f"exhaustive {full / args.queries * 1000:>10.2f} ms/query   {candidates / args.queries:.0f} postings/query")
+    print(f"maxscore   {elapsed / args.queries * 1000:>10.2f} ms/query   {scored / args.queries:.0f} scored, "
+          f"{skipped / args.queries:.0f} postings skipped/query   ranking mismatches: {mismatches}")
+
+def bench_fuzzy(args):
+    corpus = make_corpus(args.docs)
+    queries = make_queries(corpus, args.queries)
+    fuzzy_index = FuzzyCandidateIndex()
+    for doc_id, text in enumerate(corpus):
+        fuzzy_index.add(doc_id, text.split())
+    candidates = sum(len(fuzzy_index.candidates(q.split(), args.threshold)) for q, _ in queries)
+    print(f"Corpus: {args.docs} docs, {candidates / len(queries):.1f} fuzzy candidates/query on average")
+    evaluate('full scan', lambda q, k: fuzzy_search(corpus, q, k, args.threshold), queries, args.k)
+    evaluate('pruned', lambda q, k: [doc_id for doc_id, _ in fuzzy_index.search(q.split(), args.threshold)[:k]],
+             queries, args.k)
+
+def make_count_matrix(num_docs, doc_length, vocab_size, seed=0, block=100000):
+    """Synthetic (documents x terms) count matrix with Zipf-distributed term ids, built in blocks."""
+    import numpy as np
+    from scipy import sparse
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for start in range(0, num_docs, block):
+        n = min(block, num_docs - start)
+        cols = (rng.zipf(1.3, size=n * doc_length) - 1) % vocab_size
+        rows = np.repeat(np.arange(n), doc_length)
+        blocks.append(sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)),
+                                        shape=(n, vocab_size)))
+    return sparse.vstack(blocks, format='csr')
+
+def bench_tfidf(args):
+    import numpy as np
+    from tfidf_index import TfidfIndex
+    rng = np.random.default_rng(1)
+    vocabulary = {f"t{i}": i for i in range(args.vocab)}
+    terms = list(vocabulary)
+    for size in args.sizes:
+        counts = make_count_matrix(size, args.doc_length, args.vocab)
+        start = time.perf_counter()
+        tfidf = TfidfIndex.from_counts(counts, range(size), vocabulary)
+        tfidf.search([terms[0]])  # computes idf and row norms
+        build = time.perf_counter() - start
+        queries = []
+        for row in rng.integers(0, size, args.queries):
+            cols = counts.indices[counts.indptr[row]:counts.indptr[row + 1]]
+            queries.append([terms[col] for col in rng.choice(cols, min(3, len(cols)), replace=False)])
+        start = time.perf_counter()
+        for query in queries:
+            tfidf.search(query, args.k)
+        single = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        tfidf.search_batch(queries, args.k)
+        batched = (time.perf_counter() - start) / len(queries)
+        print(f"{size:>9} chunks  build {build:6.2f}s   mat-vec {single * 1000:8.2f} ms/query"
+              f"   mat-mat {batched * 1000:8.2f} ms/query (batch of {len(queries)})")
+
+def bench_dense(args):
+    import os
+    import tempfile
+    import numpy as np
+    from dense_index import DenseIndex
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        dense = DenseIndex(os.path.join(tmp, 'bench'), args.dim)
+        vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        start = time.perf_counter()
+        # Bulk-write the files directly; per-row add() is exercised by the application itself
+        scales = np.abs(vectors).max(axis=1) / 127
+        np.round(vectors / scales[:, None]).astype(np.int8).tofile(f"{dense.path}.vec")
+        scales.astype(np.float32).tofile(f"{dense.path}.scale")
+        np.arange(args.vectors, dtype=np.int64).tofile(f"{dense.path}.ids")
+        dense = DenseIndex(dense.path, args.dim)
+        print(f"{args.vectors} vectors x {args.dim} dims int8 "
+              f"({args.vectors * args.dim / 2 ** 20:.0f} MiB), loaded in {time.perf_counter() - start:.2f}s")
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        start = time.perf_counter()
+        results = [dense.search(query, args.k) for query in queries]
+        elapsed = time.perf_counter() - start
+        agree = sum(len({doc_id for doc_id, _ in hits} & set(np.argsort(-(vectors @ query))[:args.k].tolist()))
+                    for query, hits in zip(queries, results))
+        print(f"top-{args.k}: {elapsed / args.queries * 1000:.2f} ms/query, "
+              f"overlap with float32 exact top-{args.k}: {agree / (args.queries * args.k):.3f}")
+
+def bench_ann(args):
+    import os
+    import tempfile
+    import numpy as np
+    from dense_index import DenseIndex
+    from ann_index import IVFIndex
+    rng = np.random.default_rng(0)
+    # Clustered data, as real embeddings are, so IVF lists are meaningful
+    centers = rng.standard_normal((args.nlist, args.dim))
+    vectors = centers[rng.integers(0, args.nlist, args.vectors)] + 0.5 * rng.standard_normal((args.vectors, args.dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench')
+        scales = np.abs(vectors).max(axis=1) / 127
+        np.round(vectors / scales[:, None]).astype(np.int8).tofile(f"{path}.vec")
+        scales.astype(np.float32).tofile(f"{path}.scale")
+        np.arange(args.vectors, dtype=np.int64).tofile(f"{path}.ids")
+        dense = DenseIndex(path, args.dim)
+        ivf = IVFIndex(dense, path, args.nlist)
+        start = time.perf_counter()
+        ivf.train()
+        print(f"{args.vectors} vectors, {args.nlist} lists trained in {time.perf_counter() - start:.2f}s")
+        queries = vectors[rng.integers(0, args.vectors, args.queries)] + 0.2 * rng.standard_normal((args.queries, args.dim))
+        queries = queries.astype(np.float32)
+        start = time.perf_counter()
+        exact = [{doc_id for doc_id, _ in dense.search(query, args.k)} for query in queries]
+        print(f"exact       {args.queries / (time.perf_counter() - start):8.1f} queries/s   recall@{args.k}: 1.000")
+        for nprobe in args.nprobe:
+            start = time.perf_counter()
+            found = [{doc_id for doc_id, _ in ivf.search(query, args.k, nprobe)} for query in queries]
+            qps = args.queries / (time.perf_counter() - start)
+            recall = sum(len(a & b) for a, b in zip(exact, found)) / (args.queries * args.k)
+            print(f"nprobe={nprobe:<4} {qps:8.1f} queries/s   recall@{args.k}: {recall:.3f}")
+
+def bench_batch(args):
+    from concurrent.futures import ProcessPoolExecutor
+    global _batch_index
+    corpus = make_corpus(args.docs)
+    _batch_index = build_index(corpus)
+    queries = [query.split() for query, _ in make_queries(corpus, args.queries)]
+    start = time.perf_counter()
+    for query in queries:
+        _batch_index.bm25(query, args.k)
+    one_by_one = time.perf_counter() - start
+    start = time.perf_counter()
+    _batch_index.bm25_batch(queries, args.k)
+    batched = time.perf_counter() - start
+    print(f"{args.queries} queries over {args.docs} docs")
+    print(f"one at a time  {args.queries / one_by_one:10.1f} queries/s")
+    print(f"batched        {args.queries / batched:10.1f} queries/s")
+    if args.workers > 1:
+        size = -(-len(queries) // args.workers)
+        chunks = [queries[i:i + size] for i in range(0, len(queries), size)]
+        with ProcessPoolExecutor(args.workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(_bench_batch_worker, chunks, [args.k] * len(chunks)))
+            pooled = time.perf_counter() - start
+        print(f"batched x{args.workers:<4}  {args.queries / pooled:10.1f} queries/s")
+
+def bench_storage(args):
+    import os
+    import tempfile
+    from tinydb import TinyDB
+    from log_storage import AppendLogStorage
+    chunk = 'x' * args.chunk_size
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, kwargs in [('json', {}), ('append log', {'storage': AppendLogStorage})]:
+            path = os.path.join(tmp, f"{name.replace(' ', '_')}.json")
+            db = TinyDB(path, **kwargs)
+            start = time.perf_counter()
+            for _ in range(args.inserts):
+                db.insert({'content': chunk, 'category': 'pdf'})
+            elapsed = time.perf_counter() - start
+            db.close()
+            start = time.perf_counter()
+            reopened = len(TinyDB(path, **kwargs))
+            load = time.perf_counter() - start
+            print(f"{name:<12} {args.inserts / elapsed:10.1f} inserts/s   {os.path.getsize(path) / 1e6:8.1f} MB"
+                  f"   reopen: {load * 1000:.0f} ms ({reopened} docs)")
+
+def bench_compression(args):
+    import base64
+    import zlib
+    from cryptography.fernet import Fernet
+    if args.files:
+        text = ' '.join(open(path, encoding='utf-8', errors='ignore').read() for path in args.files)
+    else:
+        text = ' '.join(make_corpus(args.docs, doc_length=200))
+    chunks = [text[i:i + args.chunk_size] for i in range(0, len(text), args.chunk_size)][:args.docs]
+    fernet = Fernet(Fernet.generate_key())
+    # (name, encode, decode) matching how document_manager lays each variant out on disk
+    modes = [
+        ('raw', lambda s: s.encode('utf-8'), lambda b: b.decode('utf-8')),
+        ('encrypted (token text)', lambda s: fernet.encrypt(s.encode('utf-8')),
+         lambda b: fernet.decrypt(b).decode('utf-8')),
+        ('zlib', lambda s: zlib.compress(s.encode('utf-8'), args.level), lambda b: zlib.decompress(b).decode('utf-8')),
+        ('zlib + encrypted (raw token)',
+         lambda s: base64.urlsafe_b64decode(fernet.encrypt(zlib.compress(s.encode('utf-8'), args.level))),
+         lambda b: zlib.decompress(fernet.decrypt(base64.urlsafe_b64encode(b))).decode('utf-8')),
+    ]
+    raw_size = sum(len(chunk.encode('utf-8')) for chunk in chunks)
+    print(f"{len(chunks)} chunks of up to {args.chunk_size} characters, {raw_size / 1e6:.2f} MB raw")
+    for name, encode, decode in modes:
+        start = time.perf_counter()
+        stored = [encode(chunk) for chunk in chunks]
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for body in stored:
+            decode(body)
+        decode_time = time.perf_counter() - start
+        size = sum(len(body) for body in stored)
+        print(f"{name:<30} {size / 1e6:8.2f} MB  {size / raw_size:6.2f}x   "
+              f"write {encode_time / len(chunks) * 1e6:7.1f} us/doc   read {decode_time / len(chunks) * 1e6:7.1f} us/doc")
+
+def bench_decrypt(args):
+    import base64
+    import os
+    import zlib
+    from concurrent.futures import ProcessPoolExecutor
+    from cryptography.fernet import Fernet
+    key = Fernet.generate_key()
+    fernet = Fernet(key)
+    text = ' '.join(make_corpus(args.docs, doc_length=args.chunk_size // 4))
+    # Laid out as document_manager stores encrypted blob bodies: raw token bytes of the zlib'd text
+    bodies = [base64.urlsafe_b64decode(fernet.encrypt(zlib.compress(text[i:i + args.chunk_size].encode('utf-8'))))
+              for i in range(0, args.docs * args.chunk_size, args.chunk_size)]
+    chunks = [bodies[i:i + args.batch] for i in range(0, len(bodies), args.batch)]
+    print(f"{len(bodies)} encrypted bodies of {args.chunk_size} characters, {os.cpu_count()} CPUs")
+    start = time.perf_counter()
+    _init_decrypt_worker(key)
+    for chunk in chunks:
+        _bench_decrypt_worker(chunk)
+    serial = time.perf_counter() - start
+    print(f"serial          {len(bodies) / serial:10.0f} docs/s")
+    workers = 2
+    while workers <= args.workers:
+        with ProcessPoolExecutor(workers, initializer=_init_decrypt_worker, initargs=(key,)) as pool:
+            start = time.perf_counter()
+            list(pool.map(_bench_decrypt_worker, chunks))
+            pooled = time.perf_counter() - start
+        print(f"pool x{workers:<9} {len(bodies) / pooled:10.0f} docs/s   {serial / pooled:5.2f}x")
+        workers *= 2
+
+def _init_decrypt_worker(key):
+    global _decrypt_fernet
+    from cryptography.fernet import Fernet
+    _decrypt_fernet = Fernet(key)
+
+def _bench_decrypt_worker(bodies):
+    import base64
+    import zlib
+    return [zlib.decompress(_decrypt_fernet.decrypt(base64.urlsafe_b64encode(body))).decode('utf-8') for body in bodies]
+
+def _bench_batch_worker(queries, k):
+    return _batch_index.bm25_batch(queries, k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Search and storage benchmarks for the RAG system")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ranking = subparsers.add_parser('ranking', help="Token overlap vs. fuzzy vs. BM25 latency and quality")
+    ranking.add_argument('--docs', type=int, default=2000)
+    ranking.add_argument('--queries', type=int, default=50)
+    ranking.add_argument('--k', type=int, default=5)
+    ranking.add_argument('--skip-fuzzy', action='store_true', help="Skip the (slow) fuzzy baseline")
+    ranking.set_defaults(func=bench_ranking)
+
+    topk = subparsers.add_parser('topk', help="Exhaustive BM25 vs. block-max MaxScore top-k")
+    topk.add_argument('--docs', type=int, default=20000)
+    topk.add_argument('--queries', type=int, default=100)
+    topk.add_argument('--terms', type=int, default=4, help="Terms per query")
+    topk.add_argument('--k', type=int, default=5)
+    topk.set_defaults(func=bench_topk)
+
+    fuzzy = subparsers.add_parser('fuzzy', help="Full fuzzy scan vs. candidate-pruned fuzzy search")
+    fuzzy.add_argument('--docs', type=int, default=2000)
+    fuzzy.add_argument('--queries', type=int, default=20)
+    fuzzy.add_argument('--k', type=int, default=5)
+    fuzzy.add_argument('--threshold', type=int, default=70)
+    fuzzy.set_defaults(func=bench_fuzzy)
+
+    tfidf = subparsers.add_parser('tfidf', help="Sparse TF-IDF single vs. batched query scoring")
+    tfidf.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    tfidf.add_argument('--doc-length', type=int, default=100, help="Tokens per chunk")
+    tfidf.add_argument('--vocab', type=int, default=50000)
+    tfidf.add_argument('--queries', type=int, default=100)
+    tfidf.add_argument('--k', type=int, default=5)
+    tfidf.set_defaults(func=bench_tfidf)
+
+    dense = subparsers.add_parser('dense', help="Blocked int8 top-k latency and quantisation recall")
+    dense.add_argument('--vectors', type=int, default=100000)
+    dense.add_argument('--dim', type=int, default=256)
+    dense.add_argument('--queries', type=int, default=50)
+    dense.add_argument('--k', type=int, default=10)
+    dense.set_defaults(func=bench_dense)
+
+    ann = subparsers.add_parser('ann', help="IVF recall@k vs. queries/sec for several nprobe values")
+    ann.add_argument('--vectors', type=int, default=100000)
+    ann.add_argument('--dim', type=int, default=256)
+    ann.add_argument('--nlist', type=int, default=256)
+    ann.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    ann.add_argument('--queries', type=int, default=100)
+    ann.add_argument('--k', type=int, default=10)
+    ann.set_defaults(func=bench_ann)
+
+    batch = subparsers.add_parser('batch', help="Per-query BM25 vs. batched BM25 throughput")
+    batch.add_argument('--docs', type=int, default=5000)
+    batch.add_argument('--queries', type=int, default=2000)
+    batch.add_argument('--k', type=int, default=10)
+    batch.add_argument('--workers', type=int, default=4)
+    batch.set_defaults(func=bench_batch)
+
+    storage = subparsers.add_parser('storage', help="TinyDB JSONStorage vs. append-only log, one insert per chunk")
+    storage.add_argument('--inserts', type=int, default=2000)
+    storage.add_argument('--chunk-size', type=int, default=1000)
+    storage.set_defaults(func=bench_storage)
+
+    compression = subparsers.add_parser('compression', help="Stored size and read/write cost of raw, zlib and encrypted bodies")
+    compression.add_argument('--docs', type=int, default=5000, help="Number of chunks")
+    compression.add_argument('--chunk-size', type=int, default=1000)
+    compression.add_argument('--level', type=int, default=6, help="zlib level")
+    compression.add_argument('--files', nargs='*', help="Text files to use instead of the synthetic corpus")
+    compression.set_defaults(func=bench_compression)
+
+    decrypt = subparsers.add_parser('decrypt', help="Serial vs. process-pool decryption of encrypted bodies")
+    decrypt.add_argument('--docs', type=int, default=20000)
+    decrypt.add_argument('--chunk-size', type=int, default=1000, help="Characters per document")
+    decrypt.add_argument('--batch', type=int, default=256, help="Documents per worker task")
+    decrypt.add_argument('--workers', type=int, default=8, help="Largest pool size; doubles from 2")
+    decrypt.set_defaults(func=bench_decrypt)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+
+from search_index import InvertedIndex
+
+
+def derive_key(master_key, purpose=b'blind keyword index'):
+    # A key of its own, so HMAC digests never share key material with the Fernet ciphertexts
+    return hmac.new(master_key, purpose, hashlib.sha256).digest()
+
+
+class BlindIndex:
+    """Inverted index over keyed HMAC digests of terms instead of the terms themselves.
+
+    Documents are indexed from their token bag at ingest; queries are HMAC'd with the
+    same key and looked up directly, so search never decrypts a document and neither
+    the file nor the in-memory postings hold a plaintext term. Ranking is BM25 over
+    the digests.
+
+    What it leaks to anyone holding the file (but not the key): which documents share
+    a term (digest equality), how often each term occurs in each document, document
+    lengths, and how common each term is across the corpus. A frequency analysis can
+    recover common words, and a query's digests reveal which stored terms it asks for.
+    Without the key a digest cannot be tested against a guessed word.
+    """
+
+    def __init__(self, path, key, digest_size=16):
+        self.key = key
+        self.digest_size = digest_size
+        self.index = InvertedIndex.load(path)
+
+    def token(self, term):
+        return hmac.new(self.key, term.encode('utf-8'), hashlib.sha256).hexdigest()[:2 * self.digest_size]
+
+    def blind_terms(self, term_freqs):
+        blinded = {}
+        for term, tf in term_freqs.items():
+            token = self.token(term)
+            blinded[token] = blinded.get(token, 0) + tf
+        return blinded
+
+    def __contains__(self, doc_id):
+        return doc_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def add_terms(self, doc_id, term_freqs, fingerprint=None):
+        self.index.add_terms(doc_id, self.blind_terms(term_freqs), fingerprint)
+
+    def remove(self, doc_id):
+        self.index.remove(doc_id)
+
+    def search(self, tokens, k):
+        """Top-k (doc_id, score) for query tokens, compared only as digests."""
+        return self.index.bm25_topk([self.token(token) for token in tokens], k)[0]
+
+    def sync(self, db, terms_of):
+        self.index.sync(db, lambda doc: self.blind_terms(terms_of(doc)))
+
+    def save(self):
+        self.index.save()
@@ -0,0 +1,57 @@
+import mmap
+import os
+import threading
+
+
+class BlobStore:
+    """Append-only file of document bodies (bytes) addressed by [offset, length], read through mmap.
+
+    Bodies are written once and never modified: an update appends a new body and the
+    record points at it, a delete just drops the reference. Reads slice a read-only
+    memory map of the file, which is re-mapped only when a reference lies past its end,
+    so opening a document touches just that document's pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+        self._map = None
+        self._mapped = 0
+        self._lock = threading.Lock()
+
+    def append(self, body):
+        return self.append_many([body])[0]
+
+    def append_many(self, bodies):
+        """Write several bodies (str is stored as UTF-8) with a single write; returns [offset, length] refs."""
+        encoded = [body.encode('utf-8') if isinstance(body, str) else body for body in bodies]
+        with self._lock:
+            offset = self._file.tell()
+            refs = []
+            for data in encoded:
+                refs.append([offset, len(data)])
+                offset += len(data)
+            self._file.write(b''.join(encoded))
+            self._file.flush()
+        return refs
+
+    def read(self, ref):
+        offset, length = ref
+        with self._lock:
+            if offset + length > self._mapped:
+                self._remap()
+            return self._map[offset:offset + length]
+
+    def _remap(self):
+        size = os.path.getsize(self.path)
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b''
+        self._mapped = size
+
+    def close(self):
+        with self._lock:
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            self._file.close()
@@ -115,7 +115,7 @@ class EnhancedRAGChatbot:
             response = f"I found {len(results)} documents containing '{' '.join(keywords)}'.\n"
             response += "Here are the top results:\n"
             for i, doc in enumerate(self.state['last_docs'], 1):
-                response += f"{i}. {doc['content'][:50]}...\n"
+                response += f"{i}. {doc['preview'][:50]}...\n"
             response += "\nWould you like me to summarize any of these documents?"
         else:
             response = f"I couldn't find any documents containing '{' '.join(keywords)}'. Would you like to try a different search?"
@@ -135,7 +135,7 @@ class EnhancedRAGChatbot:
             self.state['last_docs'] = docs[:10]
             response = "Here are the most recent documents in the system:\n"
             for i, doc in enumerate(self.state['last_docs'], 1):
-                response += f"{i}. {doc['content'][:50]}...\n"
+                response += f"{i}. {doc['preview'][:50]}...\n"
             response += "\nWould you like more details on any of these documents?"
         else:
             response = "There are currently no documents in the system. Would you like to add one?"
@@ -176,7 +176,7 @@ Just tell me what you'd like to do, and I'll guide you through the process!"""
         for category, docs in categories.items():
             response += f"\n{category.capitalize()}:\n"
             for doc in docs:
-                response += f"- {doc['content'][:50]}...\n"
+                response += f"- {doc['preview'][:50]}...\n"
         return response
 
     def summarize_text(self, text, sentences=3):
@@ -3,6 +3,49 @@ from cryptography.fernet import Fernet
 
 # Database
 DB_FILE = 'documents.json'
+DB_COMPACT_MIN_OPS = 1000  # log entries before the append-only document log may be compacted
+DB_FLUSH_EVERY = 20  # buffered document writes before they are flushed to disk (0: only by timer/exit)
+DB_FLUSH_INTERVAL_MS = 1000  # flush this long after the first unflushed write (0: no timer)
+DB_FSYNC = True  # fsync the document log at every flush
+DB_SHARDS = 4  # DB_FILE is split into this many files by doc_id; changing it reshards on the next start
+DB_LOAD_WORKERS = 4  # threads opening the shards at startup
+STORAGE_BACKEND = 'tinydb'  # 'tinydb' (DB_FILE) or 'sqlite' (SQLITE_DB_FILE, FTS5 keyword search over unencrypted documents)
+SQLITE_DB_FILE = 'documents.db'
+BLOB_FILE = 'documents.blobs'  # append-only document bodies; records keep metadata and a preview
+PREVIEW_LENGTH = 80
+CONTENT_COMPRESSION = 'zlib'  # applied to bodies before encryption; None stores them uncompressed
+COMPRESSION_LEVEL = 6
+
+# Search
+INDEX_FILE = 'documents.index.enc'  # token postings and term stats, Fernet-encrypted at rest
+FUZZY_INDEX_FILE = 'documents.fuzzy.enc'  # normalized tokens for fuzzy search, encrypted like INDEX_FILE
+INDEX_LOG_MIN_OPS = 1000  # logged index changes before an index file is rewritten as a snapshot
+BM25_K1 = 1.5  # term-frequency saturation
+BM25_B = 0.75  # document-length normalisation
+SEARCH_RESULTS_LIMIT = 20
+DENSE_INDEX_FILE = 'documents.dense'  # prefix for the .vec/.scale/.ids files and the .features key fingerprint
+DENSE_DIM = 256
+ANN_INDEX_FILE = 'documents.ivf'
+BLIND_INDEX_FILE = 'documents.blind.json'  # HMAC'd terms of documents added with blind=True
+ANN_NLIST = 256  # IVF clusters; trained once ANN_NLIST * 39 documents are embedded
+ANN_NPROBE = 8  # clusters scanned per query: higher is slower with better recall
+QUERY_CACHE_SIZE = 256  # cached result lists (LRU)
+QUERY_CACHE_TTL = 300  # seconds
+DECRYPT_WORKERS = None  # processes for bulk content reads (export, analytics); None: one per CPU
+DECRYPT_CHUNK_SIZE = 256  # documents handed to a worker at a time
+NEAR_DUP_INDEX_FILE = 'documents.minhash'  # prefix for the .sig/.ids files
+MINHASH_PERMUTATIONS = 128  # values per MinHash signature
+MINHASH_BANDS = 16  # LSH bands; fewer, longer bands find fewer candidates
+NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard similarity of token bags at which documents are near-duplicates
+NEAR_DUP_COLLAPSE = True  # keyword search shows one document per near-duplicate group
+
+# Batch import
+CHUNK_SIZE = 1000  # target characters per chunk; chunks end on sentence (or word) boundaries
+CHUNK_OVERLAP = 150  # characters of trailing sentences repeated at the start of the next chunk
+IMPORT_WORKERS = None  # processes extracting PDFs; None: one per CPU
+IMPORT_QUEUE_SIZE = 8  # files extracted ahead of the database writer
+IMPORT_BATCH_SIZE = 500  # chunks per bulk insert
+IMPORT_MANIFEST_FILE = 'documents.manifest.json'  # size, mtime and content hash of every imported file
 
 # Audio
 AUDIO_FORMAT = 'wav'
@@ -25,5 +68,18 @@ SPACY_MODEL = 'en_core_web_sm'
 ITEMS_PER_PAGE = 10
 
 # Encryption
-ENCRYPTION_KEY = Fernet.generate_key()  # Generate a new key each time the app starts
-# For persistent key, you might want to store this securely and load it instead of generating new each time
\ No newline at end of file
+ENCRYPTION_KEY_FILE = 'encryption.key'  # created on first run; back it up, documents and the search index are unreadable without it
+
+def load_encryption_key(path=ENCRYPTION_KEY_FILE):
+    """Read the Fernet key from `path`, creating it (readable by the owner only) on first use."""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(Fernet.generate_key())
+    with open(path, 'rb') as f:
+        return f.read().strip()
+
+ENCRYPTION_KEY = load_encryption_key()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import math
+import os
+import zlib
+
+import numpy as np
+
+
+class HashingEmbedder:
+    """Offline, CPU-only text embedding using the hashing trick.
+
+    Each term contributes its own feature plus its character trigrams, so related word
+    forms ("index", "indexing") land close together without any model download. Features
+    are hashed into a signed `dim`-dimensional vector, weighted by 1 + log(tf) and
+    L2-normalised. With a `key` the hash is keyed BLAKE2b, so the vectors on disk cannot be
+    matched against the embeddings of guessed words without the key; without one it is
+    crc32 (stable across processes, unlike hash()).
+    """
+
+    def __init__(self, dim=256, key=None):
+        self.dim = dim
+        self.key = key
+
+    @property
+    def fingerprint(self):
+        """Identifies the feature hashing, so vectors embedded with another key can be detected."""
+        if self.key is None:
+            return 'crc32'
+        return hashlib.blake2b(b'fingerprint', digest_size=8, key=self.key).hexdigest()
+
+    def feature_hash(self, feature):
+        data = feature.encode('utf-8')
+        if self.key is None:
+            return zlib.crc32(data)
+        return int.from_bytes(hashlib.blake2b(data, digest_size=4, key=self.key).digest(), 'little')
+
+    def features(self, term):
+        yield f"w:{term}"
+        padded = f"<{term}>"
+        for i in range(len(padded) - 2):
+            yield f"c:{padded[i:i + 3]}"
+
+    def embed_terms(self, term_freqs):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, tf in term_freqs.items():
+            weight = 1 + math.log(tf)
+            for feature in self.features(term):
+                h = self.feature_hash(feature)
+                vector[(h >> 1) % self.dim] += weight if h & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class DenseIndex:
+    """int8-quantized vectors in an append-only file, memory-mapped for blocked top-k search.
+
+    Three flat files share the `path` prefix: `.vec` (int8, one row of `dim` per vector),
+    `.scale` (float32 dequantisation factor per row) and `.ids` (int64 doc_id per row, -1
+    once the row is deleted). Inserts append a row; deletes only overwrite the row's id, and
+    compact() rewrites the files once tombstones dominate.
+    """
+
+    def __init__(self, path, dim=256, block_size=65536):
+        self.path = path
+        self.dim = dim
+        self.block_size = block_size
+        self.ids = np.fromfile(f"{path}.ids", dtype=np.int64) if os.path.exists(f"{path}.ids") else np.zeros(0, np.int64)
+        self.scales = (np.fromfile(f"{path}.scale", dtype=np.float32)
+                       if os.path.exists(f"{path}.scale") else np.zeros(0, np.float32))
+        count = min(len(self.ids), len(self.scales))
+        if os.path.exists(f"{path}.vec"):
+            count = min(count, os.path.getsize(f"{path}.vec") // dim)
+        if count != len(self.ids) or count != len(self.scales):
+            # A write was interrupted half-way; drop the partial row everywhere
+            logging.error(f"Dense index '{path}' was truncated to {count} rows")
+            self._truncate(count)
+        self.rows = {int(doc_id): row for row, doc_id in enumerate(self.ids) if doc_id >= 0}
+        self.size = len(self.ids)
+        # Appended rows are collected here and folded into the arrays on the next search
+        self._new_ids = []
+        self._new_scales = []
+        self._vectors = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.rows
+
+    def _truncate(self, count):
+        self.ids = self.ids[:count]
+        self.scales = self.scales[:count]
+        self.ids.tofile(f"{self.path}.ids")
+        self.scales.tofile(f"{self.path}.scale")
+        with open(f"{self.path}.vec", 'ab') as f:
+            f.truncate(count * self.dim)
+
+    def _fold_appends(self):
+        if self._new_ids:
+            self.ids = np.concatenate([self.ids, np.array(self._new_ids, dtype=np.int64)])
+            self.scales = np.concatenate([self.scales, np.array(self._new_scales, dtype=np.float32)])
+            self._new_ids = []
+            self._new_scales = []
+
+    @property
+    def vectors(self):
+        self._fold_appends()
+        if self._vectors is None or len(self._vectors) != len(self.ids):
+            if len(self.ids) == 0:
+                return np.zeros((0, self.dim), dtype=np.int8)
+            self._vectors = np.memmap(f"{self.path}.vec", dtype=np.int8, mode='r', shape=(len(self.ids), self.dim))
+        return self._vectors
+
+    @staticmethod
+    def quantize(vector):
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), np.float32(scale)
+
+    def add(self, doc_id, vector):
+        self.remove(doc_id)
+        quantized, scale = self.quantize(vector)
+        with open(f"{self.path}.vec", 'ab') as f:
+            f.write(quantized.tobytes())
+        with open(f"{self.path}.scale", 'ab') as f:
+            f.write(scale.tobytes())
+        with open(f"{self.path}.ids", 'ab') as f:
+            f.write(np.int64(doc_id).tobytes())
+        self.rows[doc_id] = self.size
+        self.size += 1
+        self._new_ids.append(doc_id)
+        self._new_scales.append(scale)
+
+    def add_many(self, doc_ids, vectors):
+        """Append several vectors with one write per file."""
+        for doc_id in doc_ids:
+            self.remove(doc_id)
+        quantized = [self.quantize(vector) for vector in vectors]
+        if not quantized:
+            return
+        with open(f"{self.path}.vec", 'ab') as f:
+            f.write(b''.join(q.tobytes() for q, _ in quantized))
+        with open(f"{self.path}.scale", 'ab') as f:
+            f.write(np.array([scale for _, scale in quantized], dtype=np.float32).tobytes())
+        with open(f"{self.path}.ids", 'ab') as f:
+            f.write(np.array(doc_ids, dtype=np.int64).tobytes())
+        for doc_id, (_, scale) in zip(doc_ids, quantized):
+            self.rows[doc_id] = self.size
+            self.size += 1
+            self._new_ids.append(doc_id)
+            self._new_scales.append(scale)
+
+    def remove(self, doc_id):
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        self._fold_appends()
+        self.ids[row] = -1
+        with open(f"{self.path}.ids", 'r+b') as f:
+            f.seek(row * 8)
+            f.write(np.int64(-1).tobytes())
+        if self.size - len(self.rows) > len(self.rows):
+            self.compact()
+
+    def search(self, query_vector, k=10):
+        """Top-k (doc_id, cosine) pairs: one int8 x float32 matmul per block plus a partial sort."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        vectors = self.vectors
+        if len(vectors) == 0:
+            return []
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, len(vectors), self.block_size):
+            end = min(start + self.block_size, len(vectors))
+            scores = (vectors[start:end] @ query) * self.scales[start:end]
+            scores[self.ids[start:end] < 0] = -np.inf
+            rows = np.arange(start, end)
+            if len(scores) > k:
+                part = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[part], scores[part]
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+        order = np.argsort(-best_scores, kind='stable')[:k]
+        return [(int(self.ids[row]), float(score)) for row, score in zip(best_rows[order], best_scores[order])
+                if np.isfinite(score)]
+
+    def compact(self):
+        keep = np.flatnonzero(self.ids >= 0)
+        if len(keep) == len(self.ids):
+            return
+        vectors = np.array(self.vectors[keep])
+        self._vectors = None
+        tmp = f"{self.path}.vec.tmp"
+        vectors.tofile(tmp)
+        os.replace(tmp, f"{self.path}.vec")
+        self.ids = self.ids[keep]
+        self.scales = self.scales[keep]
+        self.ids.tofile(f"{self.path}.ids")
+        self.scales.tofile(f"{self.path}.scale")
+        self.rows = {int(doc_id): row for row, doc_id in enumerate(self.ids)}
+        self.size = len(self.ids)
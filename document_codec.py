@@ -0,0 +1,82 @@
+import base64
+import zlib
+
+from cryptography.fernet import Fernet
+
+from config import ENCRYPTION_KEY, CONTENT_COMPRESSION, COMPRESSION_LEVEL, PREVIEW_LENGTH
+
+# How document bodies are encoded on records and in the blob store. Kept free of any
+# database or index state so other tools (mini_rag.py, pool workers) can share it.
+
+
+def compress(text, compression=None):
+    data = text.encode('utf-8')
+    if compression == 'zlib':
+        return zlib.compress(data, COMPRESSION_LEVEL)
+    return data
+
+
+def decompress(data, compression=None):
+    if compression == 'zlib':
+        data = zlib.decompress(data)
+    return bytes(data).decode('utf-8')
+
+
+class DocumentEncryption:
+    def __init__(self, key=ENCRYPTION_KEY):
+        self.fernet = Fernet(key)
+
+    def encrypt(self, data, compression=None):
+        # Compress first: ciphertext does not compress. The token is text so records stay JSON-serializable
+        return self.fernet.encrypt(compress(data, compression)).decode()
+
+    def decrypt(self, encrypted_data, compression=None):
+        return decompress(self.fernet.decrypt(encrypted_data), compression)
+
+
+def decode_body(stored, compression, encrypted, encryption):
+    if compression is None:
+        # Inline bodies and blobs written before compression hold the text (or its Fernet token) as is
+        text = stored if isinstance(stored, str) else stored.decode('utf-8')
+        return encryption.decrypt(text) if encrypted else text
+    if encrypted:
+        # Blob bodies keep the token's raw bytes; base64 would add a third to every body on disk
+        return encryption.decrypt(base64.urlsafe_b64encode(stored), compression)
+    return decompress(stored, compression)
+
+
+# Set in each process of a decoding pool by init_decode_worker()
+_worker_encryption = None
+
+
+def init_decode_worker(key):
+    """Pool initializer: the key comes in explicitly, so workers never import the database modules."""
+    global _worker_encryption
+    _worker_encryption = DocumentEncryption(key)
+
+
+def decode_bodies(bodies):
+    """Decode (stored, compression, encrypted) tuples in a pool process set up by init_decode_worker()."""
+    return [decode_body(stored, compression, encrypted, _worker_encryption) for stored, compression, encrypted in bodies]
+
+
+def stored_forms(content, encrypt, encryption):
+    """The blob body and record preview as written: compressed, then encrypted when `encrypt`."""
+    preview = content[:PREVIEW_LENGTH]
+    if encrypt:
+        token = encryption.encrypt(content, CONTENT_COMPRESSION)
+        return base64.urlsafe_b64decode(token), encryption.encrypt(preview)
+    return compress(content, CONTENT_COMPRESSION), preview
+
+
+def body_fields(content, encrypt, blobs, encryption):
+    """Append `content` to the blob store; returns the record fields that point at it."""
+    body, preview = stored_forms(content, encrypt, encryption)
+    return {'blob': blobs.append(body), 'preview': preview, 'compression': CONTENT_COMPRESSION or 'none'}
+
+
+def replace_body(record, fields):
+    """Point a record at a new body in place, dropping the inline body and the now stale token bag."""
+    record.pop('content', None)
+    record.pop('terms', None)
+    record.update(fields)
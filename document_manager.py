@@ -1,89 +1,641 @@
-from tinydb import TinyDB, Query
+from tinydb import Query
+from tinydb.table import Document
 import datetime
 import logging
-import PyPDF2
-import re
-from config import DB_FILE, ENCRYPTION_KEY
+import heapq
+import hmac
+import hashlib
+from config import (DB_FILE, DB_SHARDS, STORAGE_BACKEND, SQLITE_DB_FILE, ENCRYPTION_KEY, INDEX_FILE, FUZZY_INDEX_FILE, SEARCH_RESULTS_LIMIT, DENSE_INDEX_FILE, DENSE_DIM,
+                    ANN_INDEX_FILE, ANN_NLIST, ANN_NPROBE, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, BLOB_FILE, PREVIEW_LENGTH,
+                    CONTENT_COMPRESSION, DECRYPT_WORKERS, DECRYPT_CHUNK_SIZE, BLIND_INDEX_FILE,
+                    IMPORT_BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP, IMPORT_MANIFEST_FILE, NEAR_DUP_INDEX_FILE, MINHASH_PERMUTATIONS,
+                    MINHASH_BANDS, NEAR_DUP_THRESHOLD, NEAR_DUP_COLLAPSE)
 from utils import get_absolute_path, is_valid_pdf, preprocess_text
-from fuzzywuzzy import fuzz
-from cryptography.fernet import Fernet
+from search_index import ShardedIndex, FuzzyCandidateIndex, stored_fingerprint, init_search_worker, bm25_batch_worker
+from tfidf_index import TfidfIndex
+from dense_index import DenseIndex, HashingEmbedder
+from ann_index import IVFIndex
+from minhash_index import MinHasher, NearDuplicateIndex
+from query_cache import QueryCache
+from sharded_store import ShardedStore
+from blind_index import BlindIndex, derive_key
+from pdf_pipeline import extract_pdf, iter_pdf_pages, iter_pdf_documents, iter_text_chunks, PageCounter, run_import, ImportManifest
+from sqlite_store import SQLiteStore
+from blob_store import BlobStore
+import document_codec
+from document_codec import DocumentEncryption, body_fields, replace_body, init_decode_worker, decode_bodies
 import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 
-db = TinyDB(DB_FILE)
+if STORAGE_BACKEND == 'sqlite':
+    db = SQLiteStore(SQLITE_DB_FILE)
+else:
+    db = ShardedStore(DB_FILE, DB_SHARDS)
 
-class DocumentEncryption:
-    def __init__(self, key=ENCRYPTION_KEY):
-        self.fernet = Fernet(key)
+# Document bodies; records hold metadata, a short preview and the body's [offset, length] here
+blobs = BlobStore(BLOB_FILE)
 
-    def encrypt(self, data):
-        return self.fernet.encrypt(data.encode())
+def flush_documents():
+    """Durability point: write buffered document changes through and fsync them.
 
-    def decrypt(self, encrypted_data):
-        return self.fernet.decrypt(encrypted_data).decode()
+    The SQLite backend commits each write itself, so there is nothing to flush.
+    """
+    if isinstance(db, ShardedStore):
+        db.flush()
 
 encryption = DocumentEncryption()
 
-def add_document(content, category='default', file_type='text', encrypt=True):
-    try:
-        if encrypt:
-            content = encryption.encrypt(content)
-        db.insert({
-            'content': content,
+def stored_content(doc):
+    # Bodies written before the blob store existed are still kept inline
+    if 'content' in doc:
+        return doc['content']
+    return blobs.read(doc['blob'])
+
+def decode_body(stored, compression, encrypted):
+    return document_codec.decode_body(stored, compression, encrypted, encryption)
+
+def document_text(doc):
+    """The plain body, decompressed and decrypted; only called when content is actually needed."""
+    return decode_body(stored_content(doc), doc.get('compression'), doc.get('encrypted', False))
+
+def document_preview(doc):
+    if 'preview' not in doc:
+        return document_text(doc)[:PREVIEW_LENGTH]
+    if doc.get('encrypted', False):
+        return encryption.decrypt(doc['preview'])
+    return doc['preview']
+
+class LazyDocument(Document):
+    """A record as handed to callers: 'content' and 'preview' are read and decrypted on first access."""
+
+    STORED_FIELDS = ('content', 'preview', 'blob')
+
+    def __init__(self, record):
+        super().__init__({key: value for key, value in record.items() if key not in self.STORED_FIELDS},
+                         record.doc_id)
+        self.record = record
+
+    def __missing__(self, key):
+        if key == 'content':
+            value = document_text(self.record)
+        elif key == 'preview':
+            value = document_preview(self.record)
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+def compute_terms(text):
+    return dict(Counter(preprocess_text(text)))
+
+def document_terms(doc):
+    """Token bag stored with the record; encrypted records and ones predating it fall back to the content."""
+    if 'terms' in doc:
+        return doc['terms']
+    return compute_terms(document_text(doc))
+
+def keeps_terms(record):
+    # Encrypted documents keep their token bag only in the encrypted index, so with the SQLite
+    # backend they are not in FTS5 either. Blind-indexed documents never keep a plaintext one.
+    if record.get('blind', False):
+        return False
+    return not record.get('encrypted', False)
+
+# Sharded like the document store: shards load in parallel and only changed ones are saved.
+# Decrypted once here and kept in memory, so queries never decrypt records.
+index = ShardedIndex(INDEX_FILE, DB_SHARDS, cipher=encryption.fernet)
+_records = db.all()
+index.sync([doc for doc in _records if not doc.get('blind', False)], document_terms)
+
+# Documents added with blind=True are searchable only through their HMAC'd terms
+blind_index = BlindIndex(BLIND_INDEX_FILE, derive_key(ENCRYPTION_KEY))
+blind_index.sync([doc for doc in _records if doc.get('blind', False)], document_terms)
+# FTS5 only ranks documents that keep a plaintext token bag; these are ranked by the encrypted index instead
+encrypted_doc_ids = {doc.doc_id for doc in _records if doc.get('encrypted', False) and not doc.get('blind', False)}
+# doc_id -> the original its record is marked a near-duplicate of, and the reverse, so the marks
+# pointing at a document can be revisited when it changes or goes away
+duplicate_marks = {doc.doc_id: doc['duplicate_of'] for doc in _records if 'duplicate_of' in doc}
+marked_duplicates = {}
+for _doc_id, _original in duplicate_marks.items():
+    marked_duplicates.setdefault(_original, set()).add(_doc_id)
+del _records
+
+# Persisted and encrypted like the index; only documents the index changed since are re-normalized
+fuzzy_index = FuzzyCandidateIndex.load(FUZZY_INDEX_FILE, encryption.fernet)
+fuzzy_index.sync(index.doc_terms, index.fingerprints)
+
+tfidf_index = TfidfIndex.from_inverted_index(index)
+
+# Keyed feature hashing: the vector files are not encrypted, so they must not be embeddings of guessable words
+embedder = HashingEmbedder(DENSE_DIM, derive_key(ENCRYPTION_KEY, b'dense features'))
+_fingerprint_file = f"{DENSE_INDEX_FILE}.features"
+_fingerprint = open(_fingerprint_file).read() if os.path.exists(_fingerprint_file) else None
+if _fingerprint != embedder.fingerprint:
+    # Vectors from unkeyed hashing (or another key): drop them and the clusters trained on them, then re-embed
+    for _path in [f"{DENSE_INDEX_FILE}.{ext}" for ext in ('vec', 'scale', 'ids')] + \
+                 [f"{ANN_INDEX_FILE}.{ext}" for ext in ('centroids.npy', 'assign')]:
+        if os.path.exists(_path):
+            os.remove(_path)
+dense_index = DenseIndex(DENSE_INDEX_FILE, DENSE_DIM)
+_missing = sorted(set(index.doc_lengths) - set(dense_index.rows))
+if _missing:
+    dense_index.add_many(_missing, [embedder.embed_terms(index.term_freqs(doc_id)) for doc_id in _missing])
+for _doc_id in set(dense_index.rows) - set(index.doc_lengths):
+    dense_index.remove(_doc_id)
+if _fingerprint != embedder.fingerprint:
+    with open(_fingerprint_file, 'w') as f:
+        f.write(embedder.fingerprint)
+
+ann_index = IVFIndex(dense_index, ANN_INDEX_FILE, ANN_NLIST, ANN_NPROBE)
+ann_index.sync()
+
+# MinHash signatures of the token bags, for flagging near-duplicates at ingest; keyed like the blind index
+minhasher = MinHasher(derive_key(ENCRYPTION_KEY, b'minhash'), MINHASH_PERMUTATIONS)
+near_dup_index = NearDuplicateIndex(NEAR_DUP_INDEX_FILE, MINHASH_PERMUTATIONS, MINHASH_BANDS, NEAR_DUP_THRESHOLD)
+_missing = sorted(set(index.doc_lengths) - set(near_dup_index.signatures))
+near_dup_index.add_many(_missing, [minhasher.signature(index.term_freqs(_doc_id)) for _doc_id in _missing])
+for _doc_id in set(near_dup_index.signatures) - set(index.doc_lengths):
+    near_dup_index.remove(_doc_id)
+
+# Repeated searches are served from here until the next write bumps the corpus generation
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+def cached_search(kind, tokens, params, compute):
+    return query_cache.get_or_compute((kind, tuple(sorted(tokens)), params), compute)
+
+def cache_stats():
+    return query_cache.stats()
+
+def index_document(doc_id, terms, record):
+    """Apply a new or changed document to every search index."""
+    index_documents([(doc_id, terms, record)])
+
+def index_documents(entries):
+    """Apply many (doc_id, terms, stored record) entries, saving each index once."""
+    blind = [entry for entry in entries if entry[2].get('blind', False)]
+    for doc_id, terms, record in blind:
+        blind_index.add_terms(doc_id, terms, stored_fingerprint(record))
+    if blind:
+        blind_index.save()
+        query_cache.bump()
+    entries = [entry for entry in entries if not entry[2].get('blind', False)]
+    if not entries:
+        return
+    for doc_id, terms, record in entries:
+        if record.get('encrypted', False):
+            encrypted_doc_ids.add(doc_id)
+        elif 'encrypted' in record:
+            encrypted_doc_ids.discard(doc_id)
+        index.add_terms(doc_id, terms, stored_fingerprint(record))
+        fuzzy_index.add(doc_id, terms, stored_fingerprint(record))
+        tfidf_index.add(doc_id, terms)
+    index.save()
+    fuzzy_index.save()
+    query_cache.bump()
+    doc_ids = [doc_id for doc_id, _, _ in entries]
+    vectors = [embedder.embed_terms(terms) for _, terms, _ in entries]
+    dense_index.add_many(doc_ids, vectors)
+    ann_index.add_many(doc_ids, vectors)
+    flag_near_duplicates(entries)
+
+def flag_near_duplicates(entries):
+    """Add (doc_id, terms, record) entries to the near-duplicate index and mark each record that nearly duplicates an older one.
+
+    The mark is 'duplicate_of': the doc_id of its closest match. Documents marked as
+    duplicates of a changed entry are matched again.
+    """
+    doc_ids = [doc_id for doc_id, _, _ in entries]
+    duplicates = near_dup_index.add_many(doc_ids, [minhasher.signature(terms) for _, terms, _ in entries])
+    set_duplicate_marks({doc_id: duplicates.get(doc_id) for doc_id in doc_ids})
+    recheck_duplicates(dependent_duplicates(doc_ids))
+    if duplicates:
+        logging.info(f"Flagged {len(duplicates)} near-duplicate document(s)")
+
+def set_duplicate_marks(marks):
+    """Apply {doc_id: original or None} marks; only records whose mark changes are written."""
+    changed = {}
+    for doc_id, original in marks.items():
+        current = duplicate_marks.get(doc_id)
+        if original == current:
+            continue
+        if current is not None:
+            forget_duplicate_mark(doc_id)
+        if original is not None:
+            duplicate_marks[doc_id] = original
+            marked_duplicates.setdefault(original, set()).add(doc_id)
+        changed.setdefault(original, []).append(doc_id)
+    for original, doc_ids in changed.items():
+        if original is None:
+            db.update(lambda doc: doc.pop('duplicate_of', None), doc_ids=doc_ids)
+        else:
+            db.update({'duplicate_of': original}, doc_ids=doc_ids)
+
+def forget_duplicate_mark(doc_id):
+    original = duplicate_marks.pop(doc_id, None)
+    if original is not None:
+        marked_duplicates[original].discard(doc_id)
+        if not marked_duplicates[original]:
+            del marked_duplicates[original]
+
+def dependent_duplicates(doc_ids):
+    """Documents marked as near-duplicates of any of `doc_ids`, other than those documents themselves."""
+    doc_ids = set(doc_ids)
+    return sorted({dependent for doc_id in doc_ids for dependent in marked_duplicates.get(doc_id, ())} - doc_ids)
+
+def recheck_duplicates(doc_ids):
+    """Match indexed documents against the near-duplicate index again and update their marks.
+
+    Older matches are preferred, as at ingest, and newer documents are matched first, so
+    the oldest of a group stays unmarked. A match whose own marks lead back to the document
+    is passed over, so no two documents end up marked as duplicates of each other.
+    """
+    marks = {}
+
+    def leads_to(other, doc_id):
+        seen = set()
+        while other is not None and other not in seen:
+            if other == doc_id:
+                return True
+            seen.add(other)
+            other = marks[other] if other in marks else duplicate_marks.get(other)
+        return False
+
+    for doc_id in sorted(doc_ids, reverse=True):
+        found = []
+        if doc_id in near_dup_index:
+            found = sorted((other for other, _ in near_dup_index.matches(near_dup_index.signatures[doc_id])
+                            if not leads_to(other, doc_id)), key=lambda other: other > doc_id)
+        marks[doc_id] = found[0] if found else None
+    set_duplicate_marks(marks)
+
+# Marks written before originals' edits and deletions were followed up may be stale
+recheck_duplicates(sorted(doc_id for doc_id, original in duplicate_marks.items()
+                          if original not in near_dup_index or doc_id not in near_dup_index
+                          or near_dup_index.similarity(doc_id, original) < near_dup_index.threshold))
+
+def unindex_document(doc_id):
+    unindex_documents([doc_id])
+
+def unindex_documents(doc_ids):
+    """Drop documents from every search index, saving each index once."""
+    blind = [doc_id for doc_id in doc_ids if doc_id in blind_index]
+    for doc_id in blind:
+        blind_index.remove(doc_id)
+    if blind:
+        blind_index.save()
+    for doc_id in doc_ids:
+        index.remove(doc_id)
+        fuzzy_index.remove(doc_id)
+        tfidf_index.remove(doc_id)
+        dense_index.remove(doc_id)
+        ann_index.remove(doc_id)
+        near_dup_index.remove(doc_id)
+        encrypted_doc_ids.discard(doc_id)
+        # The record itself is being removed, so its mark is only dropped here
+        forget_duplicate_mark(doc_id)
+    # Documents marked as duplicates of a removed one get their closest remaining match, if any
+    recheck_duplicates(dependent_duplicates(doc_ids))
+    index.save()
+    fuzzy_index.save()
+    query_cache.bump()
+
+# Keyed, so a stored chunk hash cannot be used to confirm a guess at an encrypted chunk's text
+hash_key = derive_key(ENCRYPTION_KEY, b'content hash')
+
+def content_hash(text):
+    return hmac.new(hash_key, text.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def get_records(doc_ids):
+    """Fetch raw records for `doc_ids` with a single read of the table, in the given order."""
+    records = {doc.doc_id: doc for doc in db.get(doc_ids=doc_ids)}
+    return [records[doc_id] for doc_id in doc_ids if doc_id in records]
+
+def stored_forms(content, encrypt):
+    return document_codec.stored_forms(content, encrypt, encryption)
+
+def make_records(documents, encrypt=True, progress=None, blind=False):
+    """Build metadata records for {'content', 'category', 'file_type'} dicts, appending every body in one write.
+
+    Returns the records and each one's token bag. With `blind` the records are marked for
+    the blind index (see add_document).
+    """
+    documents = list(documents)
+    bodies, records, terms = [], [], []
+    for doc in documents:
+        body, preview = stored_forms(doc['content'], encrypt)
+        bodies.append(body)
+        terms.append(compute_terms(doc['content']))
+        records.append({
+            'preview': preview,
             'timestamp': datetime.datetime.now().isoformat(),
-            'category': category,
-            'file_type': file_type,
-            'encrypted': encrypt
+            'category': doc.get('category', 'default'),
+            'file_type': doc.get('file_type', 'text'),
+            'encrypted': encrypt,
+            'compression': CONTENT_COMPRESSION or 'none'
         })
+        # Where a chunk came from: source path, [first, last] page and [start, end) offsets in its text
+        for key in ('source', 'pages', 'offsets'):
+            if key in doc:
+                records[-1][key] = doc[key]
+        if 'source' in doc:
+            records[-1]['chunk_hash'] = doc.get('chunk_hash') or content_hash(doc['content'])
+        if blind:
+            records[-1]['blind'] = True
+        if keeps_terms(records[-1]):
+            records[-1]['terms'] = terms[-1]
+        if progress:
+            progress(len(records), len(documents))
+    for record, ref in zip(records, blobs.append_many(bodies)):
+        record['blob'] = ref
+    return records, terms
+
+def make_record(content, category='default', file_type='text', encrypt=True, blind=False):
+    records, terms = make_records([{'content': content, 'category': category, 'file_type': file_type}], encrypt,
+                                  blind=blind)
+    return records[0], terms[0]
+
+def add_document(content, category='default', file_type='text', encrypt=True, blind=False):
+    """Store and index one document.
+
+    With `blind` (meant for encrypt=True) the document goes into the blind keyword index
+    only: its terms are kept as keyed HMAC digests, never as plaintext, and queries match
+    them by digest without decrypting anything. It is then found by keyword search but
+    not by fuzzy, TF-IDF or dense search. The digests still leak term equality and
+    frequencies; see BlindIndex.
+    """
+    try:
+        record, terms = make_record(content, category, file_type, encrypt, blind)
+        doc_id = db.insert(record)
+        index_document(doc_id, terms, record)
         print("Document added successfully.")
     except Exception as e:
         logging.error(f"Error adding document: {str(e)}")
         print(f"An error occurred while adding the document. Please check the log file.")
 
+def add_documents(documents, encrypt=True, progress=None, blind=False):
+    """Bulk ingest: prepare every record, store them with one insert_multiple and index them once.
+
+    `documents` is an iterable of dicts with 'content' and optional 'category' and
+    'file_type'. `progress(done, total)` is called as records are prepared and once more
+    after they are stored. `blind` is as for add_document. Returns the new doc_ids.
+    """
+    records, terms = make_records(documents, encrypt, progress, blind)
+    doc_ids = db.insert_multiple(records)
+    index_documents([(doc_id, doc_terms, record) for doc_id, doc_terms, record in zip(doc_ids, terms, records)])
+    if progress:
+        progress(len(records), len(records))
+    return doc_ids
+
 def advanced_search(query, threshold=70):
-    query_tokens = set(preprocess_text(query))
+    tokens = preprocess_text(query)
+
+    def compute():
+        matches = fuzzy_index.search(tokens, threshold)
+        similarities = dict(matches)
+        return [(LazyDocument(doc), similarities[doc.doc_id]) for doc in get_records([doc_id for doc_id, _ in matches])]
+
+    return cached_search('fuzzy', tokens, (threshold,), compute)
+
+def bm25_search(query, k=SEARCH_RESULTS_LIMIT):
+    """Top-k (doc_id, score) pairs plus counts of documents scored vs. postings skipped."""
+    return index.bm25_topk(preprocess_text(query), k)
+
+def decrypted_records(doc_ids):
+    # Bodies are only read and decrypted when a caller touches doc['content']
+    return [LazyDocument(doc) for doc in get_records(doc_ids)]
+
+def with_blind_hits(hits, tokens, k):
+    if not len(blind_index):
+        return hits
+    # Each index scores with its own collection statistics
+    return heapq.nlargest(k, hits + blind_index.search(tokens, k), key=lambda hit: hit[1])
+
+def with_encrypted_hits(ranked, queries, k):
+    """Merge FTS5 hit lists with the encrypted documents' hits from the in-memory index."""
+    if not encrypted_doc_ids:
+        return ranked
+    # Each index scores with its own collection statistics, as for the blind index
+    encrypted = index.bm25_batch(queries, k, only=encrypted_doc_ids)
+    return [heapq.nlargest(k, hits + extra, key=lambda hit: hit[1]) for hits, extra in zip(ranked, encrypted)]
+
+def keyword_hits(tokens, k):
+    if STORAGE_BACKEND == 'sqlite':
+        hits = with_encrypted_hits([db.search(tokens, k)], [tokens], k)[0]
+    else:
+        hits = index.bm25_topk(tokens, k)[0]
+    return with_blind_hits(hits, tokens, k)
+
+def blind_search(query, k=SEARCH_RESULTS_LIMIT):
+    """Keyword search over blind-indexed documents only: the query is matched as HMAC digests."""
+    tokens = preprocess_text(query)
+    return cached_search('blind', tokens, (k,),
+                         lambda: decrypted_records([doc_id for doc_id, _ in blind_index.search(tokens, k)]))
+
+def collapse_near_duplicates(docs, k):
+    """The first k documents, keeping only the best-ranked one of each near-duplicate group."""
+    seen, kept = set(), []
+    for doc in docs:
+        group = doc.get('duplicate_of', doc.doc_id)
+        if group not in seen:
+            seen.add(group)
+            kept.append(doc)
+    return kept[:k]
+
+def keyword_depth(k):
+    # Twice as many hits leave room for the near-duplicates collapsed away
+    return 2 * k if NEAR_DUP_COLLAPSE else k
+
+def keyword_results(ranked, k):
+    """Records for several hit lists, each read and decrypted once, near-duplicates collapsed as configured."""
+    records = {doc.doc_id: doc for doc in decrypted_records(sorted({doc_id for hits in ranked for doc_id, _ in hits}))}
     results = []
-    for doc in db.all():
-        content = doc['content']
-        if doc.get('encrypted', False):
-            content = encryption.decrypt(content)
-        doc_tokens = set(preprocess_text(content))
-        similarity = fuzz.token_set_ratio(query_tokens, doc_tokens)
-        if similarity >= threshold:
-            results.append((doc, similarity))
-    return sorted(results, key=lambda x: x[1], reverse=True)
-
-def search_documents(keyword):
-    results = advanced_search(keyword)
-    return [doc for doc, _ in results]
+    for hits in ranked:
+        docs = [records[doc_id] for doc_id, _ in hits if doc_id in records]
+        results.append(collapse_near_duplicates(docs, k) if NEAR_DUP_COLLAPSE else docs[:k])
+    return results
+
+def search_documents(query, k=SEARCH_RESULTS_LIMIT):
+    tokens = preprocess_text(query)
+    return cached_search('bm25', tokens, (k, NEAR_DUP_COLLAPSE),
+                         lambda: keyword_results([keyword_hits(tokens, keyword_depth(k))], k)[0])
+
+def near_duplicate_groups(threshold=None):
+    """Groups of doc_ids whose token bags are near-duplicates, over every document in the index."""
+    return near_dup_index.groups(threshold)
+
+def redundant_duplicates(group, threshold=None):
+    """Members of a near-duplicate group that are themselves near-duplicates of its first (oldest) document.
+
+    Chained members, similar only through other members, are left out.
+    """
+    threshold = near_dup_index.threshold if threshold is None else threshold
+    return [doc_id for doc_id in group[1:] if near_dup_index.similarity(group[0], doc_id) >= threshold]
+
+def search_documents_batch(queries, k=SEARCH_RESULTS_LIMIT, workers=None):
+    """Rank many queries together and return one result list per query, in order.
+
+    Each list is what search_documents() returns for its query (backend, blind index and
+    near-duplicate collapsing included). Scoring walks each distinct term's postings once
+    for the whole batch, and matching records are read and decrypted once however many
+    queries return them. With `workers` > 1 the scoring is split across a process pool.
+    """
+    tokenized = [preprocess_text(query) for query in queries]
+    depth = keyword_depth(k)
+    if STORAGE_BACKEND == 'sqlite':
+        ranked = with_encrypted_hits([db.search(tokens, depth) for tokens in tokenized], tokenized, depth)
+    elif workers and workers > 1 and len(tokenized) > 1:
+        size = -(-len(tokenized) // workers)
+        chunks = [tokenized[i:i + size] for i in range(0, len(tokenized), size)]
+        with ProcessPoolExecutor(workers, initializer=init_search_worker, initargs=(index,)) as pool:
+            ranked = [hits for part in pool.map(bm25_batch_worker, chunks, [depth] * len(chunks)) for hits in part]
+    else:
+        ranked = index.bm25_batch(tokenized, depth)
+    ranked = [with_blind_hits(hits, tokens, depth) for hits, tokens in zip(ranked, tokenized)]
+    return keyword_results(ranked, k)
+
+def tfidf_search(query, k=SEARCH_RESULTS_LIMIT):
+    """Rank documents by TF-IDF cosine similarity with one sparse mat-vec over the corpus."""
+    tokens = preprocess_text(query)
+    return cached_search('tfidf', tokens, (k,),
+                         lambda: decrypted_records([doc_id for doc_id, _ in tfidf_index.search(tokens, k)]))
+
+def tfidf_search_batch(queries, k=SEARCH_RESULTS_LIMIT):
+    """Rank several queries at once with a single sparse mat-mat product."""
+    ranked = tfidf_index.search_batch([preprocess_text(query) for query in queries], k)
+    records = {doc.doc_id: doc for doc in decrypted_records(sorted({doc_id for hits in ranked for doc_id, _ in hits}))}
+    return [[records[doc_id] for doc_id, _ in hits if doc_id in records] for hits in ranked]
+
+def dense_search(query, k=SEARCH_RESULTS_LIMIT, nprobe=ANN_NPROBE):
+    """Semantic-ish retrieval: embed the query offline and take the approximate top-k by cosine.
+
+    `nprobe` is the number of IVF clusters scanned; raise it for recall, lower it for speed.
+    """
+    tokens = preprocess_text(query)
+
+    def compute():
+        hits = ann_index.search(embedder.embed_terms(Counter(tokens)), k, nprobe)
+        return decrypted_records([doc_id for doc_id, _ in hits])
+
+    return cached_search('dense', tokens, (k, nprobe), compute)
 
 def list_all_documents():
-    docs = db.all()
-    for doc in docs:
-        if doc.get('encrypted', False):
-            doc['content'] = encryption.decrypt(doc['content'])
-    return docs
+    """Every record's metadata; showing a page decrypts only that page's previews, not any bodies."""
+    return [LazyDocument(doc) for doc in db.all()]
+
+def iter_documents(doc_ids=None, workers=DECRYPT_WORKERS, chunk_size=DECRYPT_CHUNK_SIZE):
+    """Every document (or just `doc_ids`) with its content loaded, yielded in doc_id order.
+
+    For export, analytics and other passes over full text: decryption and decompression
+    are spread over a process pool in chunks of `chunk_size`. Only two chunks per worker
+    are in flight, so documents stream out while later ones are still being decoded
+    and memory stays bounded. workers=1 decodes in this process.
+    """
+    records = db.all() if doc_ids is None else db.get(doc_ids=doc_ids)
+    records.sort(key=lambda doc: doc.doc_id)
+    chunks = (records[i:i + chunk_size] for i in range(0, len(records), chunk_size))
+
+    def loaded(chunk, texts):
+        for record, text in zip(chunk, texts):
+            doc = LazyDocument(record)
+            doc['content'] = text
+            yield doc
+
+    def bodies(chunk):
+        return [(stored_content(doc), doc.get('compression'), doc.get('encrypted', False)) for doc in chunk]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(records) <= chunk_size:
+        for chunk in chunks:
+            yield from loaded(chunk, [decode_body(*body) for body in bodies(chunk)])
+        return
+    with ProcessPoolExecutor(workers, initializer=init_decode_worker, initargs=(ENCRYPTION_KEY,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(decode_bodies, bodies(chunk))))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield from loaded(chunk, future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield from loaded(chunk, future.result())
 
 def delete_document(doc_id):
     db.remove(doc_ids=[doc_id])
+    unindex_document(doc_id)
 
 def read_latex_pdf(file_path):
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            # Enhanced LaTeX cleanup
-            text = re.sub(r'\\[a-zA-Z]+(\[.*?\])?(\{.*?\})?', '', text)
-            text = re.sub(r'\s+', ' ', text)
-            
-            return text.strip()
+        return extract_pdf(file_path)[0]
     except Exception as e:
         logging.error(f"Error reading PDF file '{file_path}': {str(e)}")
         raise
 
-def process_pdf(file_path, category='default', chunk_size=1000):
+def pdf_documents(file_path, category='default', chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split a PDF's text into chunk documents ready for add_documents()."""
+    try:
+        return list(iter_pdf_documents(iter_pdf_pages(file_path), category, chunk_size, overlap, source=file_path))
+    except Exception as e:
+        logging.error(f"Error reading PDF file '{file_path}': {str(e)}")
+        raise
+
+def store_chunks(documents, encrypt=True):
+    """Store the chunks of one or more source files, replacing what those sources stored before.
+
+    A chunk whose content hash matches one already stored for its source is kept as it is
+    (only its position fields are updated if they moved), new chunks are added, and the
+    source's chunks that no longer occur are removed. Returns the doc_ids of added chunks.
+    """
+    documents = list(documents)
+    sources = {doc['source'] for doc in documents if doc.get('source')}
+    stored = {}
+    if sources:
+        for doc in db.all():
+            if doc.get('source') in sources:
+                stored.setdefault(doc['source'], {}).setdefault(doc.get('chunk_hash'), []).append(doc)
+    new = []
+    for doc in documents:
+        doc['chunk_hash'] = content_hash(doc['content'])
+        same = stored.get(doc.get('source'), {}).get(doc['chunk_hash'])
+        if not same:
+            new.append(doc)
+            continue
+        kept = same.pop(0)
+        moved = {key: doc[key] for key in ('file_type', 'pages', 'offsets') if key in doc and kept.get(key) != doc[key]}
+        if moved:
+            db.update(moved, doc_ids=[kept.doc_id])
+    stale = [doc.doc_id for hashes in stored.values() for docs in hashes.values() for doc in docs]
+    # Unindexed first, so new chunks are not flagged as near-duplicates of the ones they replace
+    if stale:
+        unindex_documents(stale)
+    doc_ids = add_documents(new, encrypt) if new else []
+    if stale:
+        db.remove(doc_ids=stale)
+    return doc_ids
+
+def import_files(file_paths, category='batch_import', chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, progress=None):
+    """Import .txt and .pdf files, extracting them in a process pool; returns the pipeline's report.
+
+    Files are tracked in IMPORT_MANIFEST_FILE: re-importing an unchanged file costs a stat,
+    and a changed one replaces only the chunks of it that changed (see store_chunks).
+    """
+    return run_import(file_paths, store_chunks, category, chunk_size, overlap, manifest=ImportManifest(IMPORT_MANIFEST_FILE),
+                      hash_key=hash_key, progress=progress)
+
+def process_pdf(file_path, category='default', chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, progress=None):
+    """Stream a PDF into the database page by page, storing chunks in batches of IMPORT_BATCH_SIZE.
+
+    Memory is bounded by one batch, and the first batches are searchable while later pages
+    are still being extracted. If extraction fails part-way, the chunks already stored are
+    removed again so a retry does not duplicate them. `progress(pages_read, chunks_stored)`
+    follows each batch.
+    """
     abs_path = get_absolute_path(file_path)
     if not os.path.exists(abs_path):
         print(f"Error: The file '{abs_path}' does not exist.")
@@ -92,35 +644,148 @@ def process_pdf(file_path, category='default', chunk_size=1000):
         print(f"Error: The file '{abs_path}' is not a valid PDF file.")
         return False
     
+    doc_ids = []
     try:
-        full_text = read_latex_pdf(abs_path)
-        chunks = [full_text[i:i+chunk_size] for i in range(0, len(full_text), chunk_size)]
+        pages = PageCounter(iter_pdf_pages(abs_path))
+        batch = []
+        for chunk in iter_pdf_documents(pages, category, chunk_size, overlap, source=abs_path):
+            batch.append(chunk)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                doc_ids.extend(add_documents(batch))
+                batch = []
+                if progress:
+                    progress(pages.count, len(doc_ids))
+        if batch:
+            doc_ids.extend(add_documents(batch))
+        if progress:
+            progress(pages.count, len(doc_ids))
         
-        for i, chunk in enumerate(chunks):
-            add_document(chunk, category, f'pdf_chunk_{i+1}')
-        
-        print(f"PDF document '{abs_path}' processed and added successfully in {len(chunks)} chunks.")
+        print(f"PDF document '{abs_path}' processed and added successfully in {len(doc_ids)} chunks.")
         return True
     except Exception as e:
         print(f"Error processing the PDF file: {str(e)}")
         logging.error(f"Error processing PDF file '{abs_path}': {str(e)}")
+        if doc_ids:
+            # Roll back the batches stored before the failure
+            unindex_documents(doc_ids)
+            db.remove(doc_ids=doc_ids)
         return False
 
+def source_chunks(source):
+    """Raw records of the chunks stored from one source file, in text order."""
+    return sorted((doc for doc in db.all() if doc.get('source') == source), key=lambda doc: doc['offsets'][0])
+
+def reindex_source(source):
+    """Recompute one source's terms from its stored chunks and re-index them, without reading the file."""
+    docs = list(iter_documents([doc.doc_id for doc in source_chunks(source)]))
+    index_documents([(doc.doc_id, compute_terms(doc['content']), doc.record) for doc in docs])
+    return len(docs)
+
+def rechunk_source(source, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Re-split one source with new chunk settings from its stored chunks, without reading the file.
+
+    The text is put back together from the chunks' offsets and replaces them with new
+    chunks. A new chunk's pages are the tightest bounds the old chunks holding its first
+    and last character give, so they are only wider than a fresh extraction's where those
+    old chunks span several pages. Returns the new doc_ids.
+    """
+    old = sorted(iter_documents([doc.doc_id for doc in source_chunks(source)]), key=lambda doc: doc['offsets'][0])
+    if not old:
+        return []
+    base = old[0]['offsets'][0]
+    text = ''
+    for doc in old:
+        start, end = doc['offsets'][0] - base, doc['offsets'][1] - base
+        if start > len(text):
+            # Chunks without overlap leave out the space between them
+            text += ' ' * (start - len(text))
+        if end > len(text):
+            text += doc['content'][len(text) - start:]
+
+    def page_range(start, end):
+        # Every old chunk holding a character bounds its page, so the tightest bound wins
+        return [max(doc['pages'][0] for doc in old if doc['offsets'][0] <= start < doc['offsets'][1]),
+                min(doc['pages'][1] for doc in old if doc['offsets'][0] <= end - 1 < doc['offsets'][1])]
+
+    chunks = []
+    for n, chunk in enumerate(iter_text_chunks([text], chunk_size, overlap)):
+        start, end = chunk['offsets'][0] + base, chunk['offsets'][1] + base
+        chunks.append({'content': chunk['content'], 'category': old[0]['category'], 'file_type': f'pdf_chunk_{n + 1}',
+                       'source': source, 'pages': page_range(start, end), 'offsets': [start, end]})
+    # Unindexed first, so the new chunks are not flagged as near-duplicates of the old ones
+    unindex_documents([doc.doc_id for doc in old])
+    doc_ids = add_documents(chunks, old[0]['encrypted'], blind=old[0].get('blind', False))
+    db.remove(doc_ids=[doc.doc_id for doc in old])
+    return doc_ids
+
 def get_document(doc_id):
     doc = db.get(doc_id=doc_id)
-    if doc and doc.get('encrypted', False):
-        doc['content'] = encryption.decrypt(doc['content'])
+    if doc is None:
+        return None
+    doc = LazyDocument(doc)
+    doc['content'] = document_text(doc.record)
     return doc
 
 def update_document(doc_id, new_content, new_category=None):
     doc = db.get(doc_id=doc_id)
     if doc:
-        if doc.get('encrypted', False):
-            new_content = encryption.encrypt(new_content)
-        updates = {'content': new_content}
+        terms = compute_terms(new_content)
+        updates = body_fields(new_content, doc.get('encrypted', False), blobs, encryption)
+        if keeps_terms(doc):
+            updates['terms'] = terms
         if new_category:
             updates['category'] = new_category
-        db.update(updates, doc_ids=[doc_id])
+        db.update(lambda record: replace_body(record, updates), doc_ids=[doc_id])
+        index_document(doc_id, terms, dict(updates, blind=doc.get('blind', False)))
         print("Document updated successfully.")
     else:
-        print("Document not found.")
\ No newline at end of file
+        print("Document not found.")
+
+
+def backfill_terms():
+    """One-shot migration: store the token bag on records written before it was kept at ingest.
+
+    Runs as a single table update so documents.json is rewritten once, not once per record.
+    Encrypted records are skipped: their token bag lives in the encrypted index.
+    """
+    migrated = [0]
+
+    def store_terms(doc):
+        if 'terms' in doc or not keeps_terms(doc):
+            return
+        try:
+            doc['terms'] = compute_terms(document_text(doc))
+            migrated[0] += 1
+        except Exception as e:
+            logging.error(f"Error backfilling terms: {str(e)}")
+
+    db.update(store_terms)
+    return migrated[0]
+
+def move_bodies_to_blobs():
+    """One-shot migration: move inline bodies into the blob store and leave a preview on the record."""
+    migrated = [0]
+
+    def move_body(doc):
+        if 'content' not in doc:
+            return
+        try:
+            preview = document_text(doc)[:PREVIEW_LENGTH]
+            if doc.get('encrypted', False):
+                preview = encryption.encrypt(preview)
+            doc['blob'] = blobs.append(doc['content'])
+            doc['preview'] = preview
+            del doc['content']
+            migrated[0] += 1
+        except Exception as e:
+            logging.error(f"Error moving document body to the blob store: {str(e)}")
+
+    db.update(move_body)
+    return migrated[0]
+
+def seal_terms():
+    """One-shot migration: drop plaintext token bags from encrypted records already in the encrypted index."""
+    doc_ids = [doc.doc_id for doc in db.all() if 'terms' in doc and not keeps_terms(doc) and doc.doc_id in index]
+    if doc_ids:
+        db.update(lambda doc: doc.pop('terms', None), doc_ids=doc_ids)
+    return len(doc_ids)
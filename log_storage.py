@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+
+from tinydb.storages import Storage
+
+from config import DB_COMPACT_MIN_OPS
+
+
+def fsync_directory(path):
+    # Makes a rename durable: the new directory entry survives a crash, not just the file's data
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class _TrackedDocument(dict):
+    """Stored document that records in-place edits, which TinyDB's update() makes directly."""
+
+    __slots__ = ('dirty', 'key')
+
+    def __init__(self, value, dirty, key):
+        super().__init__(value)
+        self.dirty = dirty
+        self.key = key
+
+    def _touch(self):
+        self.dirty.add(self.key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._touch()
+
+    def pop(self, *args):
+        self._touch()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._touch()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self._touch()
+        return super().setdefault(key, default)
+
+    def clear(self):
+        super().clear()
+        self._touch()
+
+
+class AppendLogStorage(Storage):
+    """TinyDB storage that appends one log line per changed document instead of rewriting the file.
+
+    The file starts with a snapshot line in TinyDB's own JSON layout (so an existing
+    documents.json is read as-is) followed by operation lines: ["put", table, id, doc],
+    ["del", table, id] and ["drop", table]. The tables live in memory and are rebuilt by
+    replaying the log at startup; a torn last line from an interrupted write is dropped.
+    Once the log holds more operations than documents (and at least `compact_min`), a
+    background thread writes a fresh snapshot and swaps it in atomically, carrying over
+    any operations appended meanwhile.
+
+    Use as a drop-in: TinyDB(DB_FILE, storage=AppendLogStorage).
+    """
+
+    def __init__(self, path, compact_min=DB_COMPACT_MIN_OPS):
+        self.path = path
+        self.compact_min = compact_min
+        self.tables = {}
+        self.ops = 0
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._backlog = None
+        self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._maybe_compact()
+
+    def _track(self, name, doc_id, doc):
+        return _TrackedDocument(doc, self._dirty, (name, doc_id))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        for raw in data.splitlines(keepends=True):
+            line = raw.strip()
+            if line:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.error(f"Dropping unreadable log tail of '{self.path}' at byte {offset}")
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(offset)
+                    break
+                self._apply(entry)
+            offset += len(raw)
+        if data and not data.endswith(b'\n') and offset == len(data):
+            # Complete last entry without its newline (e.g. a file written by JSONStorage)
+            with open(self.path, 'ab') as f:
+                f.write(b'\n')
+        self._dirty.clear()
+
+    def _apply(self, entry):
+        if isinstance(entry, dict):
+            self.tables = {name: {doc_id: self._track(name, doc_id, doc) for doc_id, doc in table.items()}
+                           for name, table in entry.items()}
+            self.ops = 0
+            return
+        op, name = entry[0], entry[1]
+        if op == 'put':
+            self.tables.setdefault(name, {})[entry[2]] = self._track(name, entry[2], entry[3])
+        elif op == 'del':
+            self.tables.get(name, {}).pop(entry[2], None)
+        elif op == 'drop':
+            self.tables.pop(name, None)
+        self.ops += 1
+
+    def read(self):
+        with self._lock:
+            # TinyDB never mutates the table dicts it reads, it builds new ones for write()
+            return dict(self.tables)
+
+    def write(self, data):
+        with self._lock:
+            entries = []
+            for name in [name for name in self.tables if name not in data]:
+                del self.tables[name]
+                entries.append(['drop', name])
+            puts = {}
+            for name, table in data.items():
+                current = self.tables.setdefault(name, {})
+                if table is current:
+                    continue
+                for doc_id in current.keys() - table.keys():
+                    del current[doc_id]
+                    entries.append(['del', name, doc_id])
+                for doc_id, doc in table.items():
+                    if current.get(doc_id) is not doc:
+                        current[doc_id] = puts[name, doc_id] = self._track(name, doc_id, doc)
+            for name, doc_id in self._dirty:
+                doc = self.tables.get(name, {}).get(doc_id)
+                if doc is not None:
+                    puts[name, doc_id] = doc
+            self._dirty.clear()
+            entries.extend(['put', name, doc_id, doc] for (name, doc_id), doc in puts.items())
+            if entries:
+                self._append(entries)
+
+    def _append(self, entries):
+        lines = [json.dumps(entry) + '\n' for entry in entries]
+        self._file.write(''.join(lines))
+        self._file.flush()
+        if self._backlog is not None:
+            self._backlog.extend(lines)
+        self.ops += len(entries)
+        self._maybe_compact()
+
+    def sync(self):
+        """Force appended entries to stable storage."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _maybe_compact(self):
+        live = sum(len(table) for table in self.tables.values())
+        if self._compactor is None and self.ops > max(self.compact_min, live):
+            self.compact(wait=False)
+
+    def compact(self, wait=True):
+        """Rewrite the log as a single snapshot; runs on a background thread unless `wait`."""
+        with self._lock:
+            if self._compactor is None:
+                snapshot = {name: {doc_id: dict(doc) for doc_id, doc in table.items()}
+                            for name, table in self.tables.items()}
+                self._backlog = []
+                self._compactor = threading.Thread(target=self._write_snapshot, args=(snapshot,),
+                                                   name='log-compaction')
+                self._compactor.start()
+            compactor = self._compactor
+        if wait:
+            compactor.join()
+
+    def _write_snapshot(self, snapshot):
+        tmp = f"{self.path}.compact"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+                f.write('\n')
+            with self._lock:
+                with open(tmp, 'a', encoding='utf-8') as f:
+                    f.write(''.join(self._backlog))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                fsync_directory(self.path)
+                self._file.close()
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self.ops = len(self._backlog)
+        except Exception as e:
+            logging.error(f"Error compacting '{self.path}': {str(e)}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        finally:
+            with self._lock:
+                self._backlog = None
+                self._compactor = None
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._file.close()
@@ -1,16 +1,19 @@
 import asyncio
+import atexit
 import logging
 import os
+import signal
 import datetime
 from colorama import init
 import curses
 
 from utils import setup_logging, download_nltk_data
-from document_manager import add_document, search_documents, list_all_documents, delete_document, process_pdf
+from document_manager import (add_document, search_documents, list_all_documents, delete_document,
+                              process_pdf, import_files, cache_stats, flush_documents, iter_documents)
 from audio_processor import record_audio, transcribe_audio, play_audio, list_audio_files, delete_audio, speech_to_text
 from nlp_processor import nlp_mode
 from chatbot import chatbot_mode
-from user_interface import AIThemedInterface, show_message, get_confirmation, get_input, select_document
+from user_interface import AIThemedInterface, show_message, show_progress, get_confirmation, get_input, select_document
 
 init(autoreset=True)  # Initialize colorama
 
@@ -37,7 +40,7 @@ async def speech_interaction_mode(stdscr):
             query = text[len('search'):].strip()
             results = search_documents(query)
             if results:
-                result_text = "Search results:\n" + "\n".join([f"- {doc['content'][:50]}..." for doc in results[:3]])
+                result_text = "Search results:\n" + "\n".join([f"- {doc['preview'][:50]}..." for doc in results[:3]])
                 await show_message(stdscr, "Search Results", result_text)
             else:
                 await show_message(stdscr, "No Results", "No documents found.")
@@ -77,16 +80,16 @@ async def batch_import_documents(stdscr):
         return
     
     await show_message(stdscr, "Import Started", f"Importing {len(files)} files...")
-    for file in files:
-        file_path = os.path.join(folder_path, file)
-        if file.endswith('.pdf'):
-            process_pdf(file_path, 'batch_import')
-        else:
-            with open(file_path, 'r') as f:
-                content = f.read()
-                add_document(content, 'batch_import')
-    
-    await show_message(stdscr, "Import Complete", f"Successfully imported {len(files)} documents.")
+    # Files are extracted in parallel and written in bulk batches; a bad file is skipped, not fatal
+    report = import_files([os.path.join(folder_path, file) for file in files],
+                          progress=lambda done, total: show_progress(stdscr, "Importing", done, total))
+    message = (f"Successfully imported {report['files']} files ({report['pages']} pages) in {report['seconds']:.1f}s: "
+               f"{report['files_per_sec']:.1f} files/s, {report['pages_per_sec']:.1f} pages/s.")
+    if report['unchanged']:
+        message += f"\n{report['unchanged']} unchanged files skipped."
+    if report['failed']:
+        message += f"\n{len(report['failed'])} files failed: " + ', '.join(os.path.basename(path) for path, _ in report['failed'])
+    await show_message(stdscr, "Import Complete", message)
 
 async def export_documents(stdscr):
     documents = list_all_documents()
@@ -103,7 +106,8 @@ async def export_documents(stdscr):
             return
     
     await show_message(stdscr, "Export Started", f"Exporting {len(documents)} documents...")
-    for doc in documents:
+    # Bodies are decrypted in parallel and streamed in doc_id order
+    for doc in iter_documents():
         filename = f"doc_{doc.doc_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         with open(os.path.join(export_path, filename), 'w') as f:
             f.write(f"Timestamp: {doc['timestamp']}\n")
@@ -113,7 +117,7 @@ async def export_documents(stdscr):
     await show_message(stdscr, "Export Complete", f"Successfully exported {len(documents)} documents to {export_path}")
 
 async def document_analytics(stdscr):
-    documents = list_all_documents()
+    documents = list(iter_documents())
     if not documents:
         await show_message(stdscr, "No Documents", "No documents available for analysis.")
         return
@@ -134,6 +138,7 @@ async def document_analytics(stdscr):
             shortest_doc = doc['content']
     
     avg_word_count = word_count / total_docs
+    cache = cache_stats()
     
     analytics_text = f"""Document Analytics:
 Total documents: {total_docs}
@@ -143,13 +148,28 @@ Category distribution:
 {', '.join([f"{category}: {count} ({count/total_docs*100:.2f}%)" for category, count in categories.items()])}
 
 Longest document: {len(longest_doc)} characters
-Shortest document: {len(shortest_doc)} characters"""
+Shortest document: {len(shortest_doc)} characters
+
+Search cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']*100:.1f}% hit rate)"""
 
     await show_message(stdscr, "Document Analytics", analytics_text)
 
+def handle_shutdown_signal(signum, frame):
+    # Flush before unwinding so curses.wrapper can still restore the terminal
+    flush_documents()
+    raise SystemExit(128 + signum)
+
+def install_shutdown_hooks():
+    """Buffered document writes must reach disk on exit, Ctrl-C, SIGTERM or a closed terminal."""
+    atexit.register(flush_documents)
+    for name in ('SIGTERM', 'SIGHUP'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handle_shutdown_signal)
+
 async def rag_process(stdscr):
     setup_logging()
     download_nltk_data()
+    install_shutdown_hooks()
 
     interface = AIThemedInterface()
 
@@ -159,6 +179,7 @@ async def rag_process(stdscr):
 
             if choice == "Exit":
                 if await get_confirmation(stdscr, "Exit", "Are you sure you want to exit?"):
+                    flush_documents()
                     await show_message(stdscr, "Goodbye", "Thank you for using the Enhanced RAG System. Goodbye!")
                     break
                 continue
@@ -235,7 +256,7 @@ async def rag_process(stdscr):
                 if documents:
                     selected_doc = await select_document(stdscr, documents, "Select Document to Delete")
                     if selected_doc:
-                        if await get_confirmation(stdscr, "Confirm Deletion", f"Are you sure you want to delete this document?\nContent: {selected_doc['content'][:50]}..."):
+                        if await get_confirmation(stdscr, "Confirm Deletion", f"Are you sure you want to delete this document?\nContent: {selected_doc['preview'][:50]}..."):
                             delete_document(selected_doc.doc_id)
                             await show_message(stdscr, "Success", "Document deleted successfully.")
                         else:
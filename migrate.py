@@ -0,0 +1,117 @@
+import argparse
+import logging
+
+from utils import setup_logging
+
+def migrate_terms(args):
+    from document_manager import backfill_terms
+    migrated = backfill_terms()
+    print(f"Stored token bags for {migrated} documents.")
+
+def migrate_blobs(args):
+    from document_manager import move_bodies_to_blobs
+    migrated = move_bodies_to_blobs()
+    print(f"Moved {migrated} document bodies to the blob store.")
+
+def migrate_seal(args):
+    from config import STORAGE_BACKEND
+    from document_manager import seal_terms, db
+    migrated = seal_terms()
+    if STORAGE_BACKEND == 'sqlite' and migrated:
+        # Their FTS5 rows are emptied too; rewrite the file so the old terms are not left in free pages
+        db.vacuum()
+    print(f"Removed plaintext token bags from {migrated} encrypted documents.")
+
+def migrate_sqlite(args):
+    from config import DB_FILE, SQLITE_DB_FILE
+    from sharded_store import ShardedStore
+    from sqlite_store import SQLiteStore
+    source = ShardedStore(args.source or DB_FILE)
+    target = SQLiteStore(args.target or SQLITE_DB_FILE)
+    if len(target) and not args.force:
+        print(f"'{target.path}' already holds {len(target)} documents; use --force to import anyway.")
+        return
+    # Documents keep their doc_ids, so the search index files stay valid after switching backends
+    docs = source.all()
+    filled = fill_terms(docs)
+    target.insert_multiple(docs)
+    print(f"Copied {len(docs)} documents to '{target.path}' ({filled} token bags rebuilt for FTS5). "
+          f"Set STORAGE_BACKEND = 'sqlite' in config.py to use it.")
+
+def fill_terms(docs):
+    """Give every unencrypted record the token bag FTS5 searches.
+
+    Records older than the stored token bag have none in the TinyDB store. Encrypted and
+    blind-indexed records never keep a plaintext one (they are ranked through the encrypted
+    and blind indexes), so any left on them by an older version is dropped.
+    """
+    from collections import Counter
+    from blob_store import BlobStore
+    from config import BLOB_FILE
+    from document_codec import decode_body
+    from utils import preprocess_text
+    blobs = BlobStore(BLOB_FILE)
+    filled = 0
+    for doc in docs:
+        if doc.get('encrypted', False) or doc.get('blind', False):
+            doc.pop('terms', None)
+            continue
+        if 'terms' in doc:
+            continue
+        try:
+            stored = doc['content'] if 'content' in doc else blobs.read(doc['blob'])
+            doc['terms'] = dict(Counter(preprocess_text(decode_body(stored, doc.get('compression'), False, None))))
+            filled += 1
+        except Exception as e:
+            logging.error(f"Error rebuilding the token bag of document {doc.doc_id}: {str(e)}")
+    return filled
+
+def migrate_dedup(args):
+    from document_manager import (near_duplicate_groups, redundant_duplicates, get_records, document_preview,
+                                  unindex_documents, db)
+    groups = near_duplicate_groups(args.threshold)
+    redundant = [doc_id for group in groups for doc_id in redundant_duplicates(group, args.threshold)]
+    chained = sum(len(group) - 1 for group in groups) - len(redundant)
+    print(f"{len(groups)} near-duplicate groups, {len(redundant)} redundant documents "
+          f"({chained} more only similar through other group members are kept).")
+    for group in groups[:args.show]:
+        docs = get_records(group)
+        print(f"- {len(group)} documents: " + ', '.join(f"#{doc.doc_id} ({doc.get('category', 'default')})" for doc in docs))
+        print(f"  {document_preview(docs[0])}")
+    if args.remove and redundant:
+        # The oldest document of each group is kept, and so is any member below the threshold against it
+        db.remove(doc_ids=redundant)
+        unindex_documents(redundant)
+        print(f"Removed {len(redundant)} documents.")
+
+def main():
+    parser = argparse.ArgumentParser(description="One-shot migrations for the document database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    terms = subparsers.add_parser('terms', help="Backfill the stored token bag on existing documents")
+    terms.set_defaults(func=migrate_terms)
+
+    blobs = subparsers.add_parser('blobs', help="Move inline document bodies into the blob store")
+    blobs.set_defaults(func=migrate_blobs)
+
+    seal = subparsers.add_parser('seal', help="Drop plaintext token bags from encrypted documents (and from the FTS5 table with the SQLite backend)")
+    seal.set_defaults(func=migrate_seal)
+
+    sqlite = subparsers.add_parser('sqlite', help="Copy the TinyDB document store into the SQLite/FTS5 database")
+    sqlite.add_argument('--source', help="TinyDB store to read; shards are found next to it (default: DB_FILE)")
+    sqlite.add_argument('--target', help="SQLite file to write (default: SQLITE_DB_FILE)")
+    sqlite.add_argument('--force', action='store_true', help="Import even if the target already has documents")
+    sqlite.set_defaults(func=migrate_sqlite)
+
+    dedup = subparsers.add_parser('dedup', help="Report near-duplicate documents, optionally removing the near-duplicates of the oldest in each group")
+    dedup.add_argument('--threshold', type=float, help="Estimated Jaccard similarity (default: NEAR_DUP_THRESHOLD)")
+    dedup.add_argument('--show', type=int, default=20, help="Groups to list")
+    dedup.add_argument('--remove', action='store_true', help="Delete the documents that are near-duplicates of the oldest in their group")
+    dedup.set_defaults(func=migrate_dedup)
+
+    args = parser.parse_args()
+    setup_logging()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
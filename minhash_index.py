@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+
+class MinHasher:
+    """MinHash signatures of documents' token bags.
+
+    The shingles are a bag's tokens counted out (a term occurring twice gives term#0 and
+    term#1), so two signatures agree in about the Jaccard similarity of the two multisets
+    of positions. Shingles are hashed to 64 bits with keyed BLAKE2b and each of the
+    `num_perm` hash functions is a multiply-shift of that hash with fixed random
+    constants, so signatures are comparable across runs and processes.
+    """
+
+    def __init__(self, key, num_perm=128, seed=1):
+        self.key = key
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    @property
+    def num_perm(self):
+        return len(self.a)
+
+    def shingle_hashes(self, term_freqs):
+        return np.fromiter((int.from_bytes(hashlib.blake2b(f"{term}#{i}".encode('utf-8'), digest_size=8,
+                                                           key=self.key).digest(), 'little')
+                            for term, tf in term_freqs.items() for i in range(tf)), dtype=np.uint64)
+
+    def signature(self, term_freqs):
+        """uint32 signature of a {term: tf} bag, or None for an empty one."""
+        hashes = self.shingle_hashes(term_freqs)
+        if not len(hashes):
+            return None
+        # uint64 arithmetic wraps, which is what multiply-shift hashing wants
+        return ((np.outer(self.a, hashes) + self.b[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH banding index over MinHash signatures, for finding near-duplicate documents.
+
+    A signature is cut into `bands` bands; documents sharing a whole band land in the same
+    bucket and become candidates, and a candidate whose signature agrees in at least
+    `threshold` of its positions (the Jaccard estimate) is a near-duplicate. A lookup reads
+    a handful of buckets instead of the collection. With 128 values in 16 bands of 8, pairs
+    at Jaccard 0.9 become candidates with probability 0.9999, at 0.8 with 0.95 and at 0.5
+    with 0.06.
+
+    Signatures are persisted next to `path` like a DenseIndex: `.sig` (uint32 rows) and
+    `.ids` (int64 doc_id per row, -1 once deleted), appended to on insert and rewritten
+    once deleted rows dominate. Buckets are rebuilt in memory on load.
+    """
+
+    def __init__(self, path, num_perm=128, bands=16, threshold=0.8):
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} signature values cannot be split into {bands} bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        ids = np.fromfile(f"{path}.ids", dtype=np.int64) if os.path.exists(f"{path}.ids") else np.zeros(0, np.int64)
+        sigs = np.fromfile(f"{path}.sig", dtype=np.uint32) if os.path.exists(f"{path}.sig") else np.zeros(0, np.uint32)
+        count = min(len(ids), len(sigs) // num_perm)
+        if count != len(ids) or count * num_perm != len(sigs):
+            # A write was interrupted half-way; drop the partial row from both files
+            logging.error(f"Near-duplicate index '{path}' was truncated to {count} rows")
+            ids, sigs = ids[:count], sigs[:count * num_perm]
+            ids.tofile(f"{path}.ids")
+            sigs.tofile(f"{path}.sig")
+        sigs = sigs.reshape(-1, num_perm)
+        self.size = count
+        self.rows = {}
+        self.signatures = {}
+        self.buckets = [{} for _ in range(bands)]
+        for row, (doc_id, sig) in enumerate(zip(ids.tolist(), sigs)):
+            if doc_id >= 0:
+                self.rows[doc_id] = row
+                self._insert(doc_id, sig)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.signatures
+
+    def _band_keys(self, sig):
+        return [sig[i * self.rows_per_band:(i + 1) * self.rows_per_band].tobytes() for i in range(self.bands)]
+
+    def _insert(self, doc_id, sig):
+        self.signatures[doc_id] = sig
+        for bucket, key in zip(self.buckets, self._band_keys(sig)):
+            bucket.setdefault(key, set()).add(doc_id)
+
+    def similarity(self, doc_id, other):
+        """Estimated Jaccard similarity of two indexed documents."""
+        return float((self.signatures[doc_id] == self.signatures[other]).mean())
+
+    def matches(self, sig, threshold=None):
+        """Indexed (doc_id, estimated Jaccard) pairs at or above `threshold`, most similar first."""
+        threshold = self.threshold if threshold is None else threshold
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._band_keys(sig)):
+            candidates.update(bucket.get(key, ()))
+        if not candidates:
+            return []
+        candidates = sorted(candidates)
+        similarity = (np.stack([self.signatures[doc_id] for doc_id in candidates]) == sig).mean(axis=1)
+        found = [(doc_id, float(s)) for doc_id, s in zip(candidates, similarity) if s >= threshold]
+        return sorted(found, key=lambda match: (-match[1], match[0]))
+
+    def add_many(self, doc_ids, signatures):
+        """Index signatures (None for an empty document) with one write per file.
+
+        Returns {doc_id: original} for each document that nearly duplicates one indexed
+        before it, including earlier ones in the same call; the original is the most
+        similar match, the oldest on ties.
+        """
+        for doc_id in doc_ids:
+            self.remove(doc_id)
+        duplicates, added = {}, []
+        for doc_id, sig in zip(doc_ids, signatures):
+            if sig is None:
+                continue
+            found = self.matches(sig)
+            if found:
+                duplicates[doc_id] = found[0][0]
+            self._insert(doc_id, sig)
+            added.append(doc_id)
+        if added:
+            with open(f"{self.path}.sig", 'ab') as f:
+                f.write(np.stack([self.signatures[doc_id] for doc_id in added]).tobytes())
+            with open(f"{self.path}.ids", 'ab') as f:
+                f.write(np.array(added, dtype=np.int64).tobytes())
+            for doc_id in added:
+                self.rows[doc_id] = self.size
+                self.size += 1
+        return duplicates
+
+    def remove(self, doc_id):
+        sig = self.signatures.pop(doc_id, None)
+        if sig is None:
+            return
+        for bucket, key in zip(self.buckets, self._band_keys(sig)):
+            members = bucket[key]
+            members.discard(doc_id)
+            if not members:
+                del bucket[key]
+        row = self.rows.pop(doc_id)
+        with open(f"{self.path}.ids", 'r+b') as f:
+            f.seek(row * 8)
+            f.write(np.int64(-1).tobytes())
+        if self.size - len(self.rows) > len(self.rows):
+            self.compact()
+
+    def compact(self):
+        doc_ids = sorted(self.signatures, key=self.rows.get)
+        tmp = f"{self.path}.sig.tmp"
+        np.array([self.signatures[doc_id] for doc_id in doc_ids], dtype=np.uint32).tofile(tmp)
+        os.replace(tmp, f"{self.path}.sig")
+        np.array(doc_ids, dtype=np.int64).tofile(f"{self.path}.ids")
+        self.rows = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        self.size = len(doc_ids)
+
+    def groups(self, threshold=None):
+        """Every indexed document in a near-duplicate group, as sorted doc_id lists ordered by their first doc_id.
+
+        Groups are connected components of the near-duplicate pairs, so members of a long
+        chain of small edits can be less similar to each other than `threshold`.
+        """
+        parent = {}
+
+        def find(doc_id):
+            while parent.setdefault(doc_id, doc_id) != doc_id:
+                doc_id = parent[doc_id]
+            return doc_id
+
+        for doc_id, sig in self.signatures.items():
+            for other, _ in self.matches(sig, threshold):
+                a, b = find(doc_id), find(other)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+        members = {}
+        for doc_id in parent:
+            members.setdefault(find(doc_id), []).append(doc_id)
+        return sorted((sorted(group) for group in members.values() if len(group) > 1), key=lambda group: group[0])
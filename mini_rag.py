@@ -1,6 +1,8 @@
+import base64
 import json
 import tempfile
-from tinydb import TinyDB, Query
+import zlib
+from tinydb import Query
 import pyaudio
 import wave
 import speech_recognition as sr
@@ -25,8 +27,12 @@ from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from collections import Counter
-import PyPDF2
 import re
+from search_index import InvertedIndex, content_fingerprint
+from pdf_pipeline import iter_pdf_pages
+from sharded_store import ShardedStore
+from blob_store import BlobStore
+from document_codec import DocumentEncryption, body_fields, replace_body
 
 print(f"Current working directory: {os.getcwd()}")
 
@@ -34,8 +40,30 @@ print(f"Current working directory: {os.getcwd()}")
 logging.basicConfig(filename='mini_rag.log', level=logging.ERROR, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Initialize TinyDB
-db = TinyDB('documents.json')
+# Initialize the document store (same sharded layout as the main app)
+db = ShardedStore('documents.json')
+
+# Inverted index over lemmatized document tokens, kept next to documents.json
+INDEX_FILE = 'documents.lemma_index.json'
+doc_index = InvertedIndex.load(INDEX_FILE)
+
+# Bodies of documents added through main.py live in the blob store; records keep a preview
+blob_store = BlobStore('documents.blobs')
+encryption = DocumentEncryption()
+
+def doc_content(doc):
+    if 'content' in doc:
+        return doc['content']
+    body = blob_store.read(doc['blob'])
+    if doc.get('encrypted', False) and 'compression' in doc:
+        # Encrypted bodies are stored as raw token bytes; show the token as main.py used to
+        return base64.urlsafe_b64encode(body).decode()
+    if doc.get('compression') == 'zlib':
+        body = zlib.decompress(body)
+    return body.decode('utf-8')
+
+def doc_preview(doc):
+    return doc['preview'] if 'preview' in doc else doc_content(doc)[:50]
 
 # Load SpaCy model
 nlp = spacy.load("en_core_web_sm")
@@ -68,12 +96,21 @@ except LookupError:
     nltk.download('punkt_tab', quiet=True)
     print("NLTK data downloaded successfully!")
 
+lemmatizer = WordNetLemmatizer()
+stop_words = set(stopwords.words('english'))
+
+def preprocess_text(text):
+    """Tokenize, lemmatize and drop stopwords; shared by the chatbot and the document index."""
+    tokens = word_tokenize(text.lower())
+    tokens = [lemmatizer.lemmatize(token) for token in tokens if token.isalnum()]
+    return [token for token in tokens if token not in stop_words]
+
 #Simple RAG chatbot
 class SimpleRAGChatbot:
-    def __init__(self, db):
+    def __init__(self, db, index=None):
         self.db = db
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
+        self.index = index if index is not None else doc_index
+        self.index.sync(self.db, lambda doc: Counter(preprocess_text(doc_content(doc))))
         self.intents = {
             'greeting': ['hello', 'hi', 'hey', 'greetings'],
             'farewell': ['bye', 'goodbye', 'see you'],
@@ -86,10 +123,7 @@ class SimpleRAGChatbot:
 
     def preprocess(self, text):
         try:
-            tokens = word_tokenize(text.lower())
-            tokens = [self.lemmatizer.lemmatize(token) for token in tokens if token.isalnum()]
-            tokens = [token for token in tokens if token not in self.stop_words]
-            return tokens
+            return preprocess_text(text)
         except Exception as e:
             logging.error(f"Error in preprocessing: {str(e)}")
             return []
@@ -132,14 +166,15 @@ class SimpleRAGChatbot:
 
     def get_relevant_docs(self, tokens, limit=3):
         try:
+            # Only the postings of the query tokens are touched, and only until the top `limit` are settled
             relevant_docs = []
-            for doc in self.db.all():
-                doc_tokens = self.preprocess(doc['content'])
-                relevance = sum(token in doc_tokens for token in tokens)
-                if relevance > 0:
-                    relevant_docs.append((doc, relevance))
-            relevant_docs.sort(key=lambda x: x[1], reverse=True)
-            return [doc for doc, _ in relevant_docs[:limit]]
+            for doc_id, _ in self.index.bm25_topk(tokens, limit)[0]:
+                doc = self.db.get(doc_id=doc_id)
+                if doc is not None:
+                    relevant_docs.append(doc)
+                if len(relevant_docs) == limit:
+                    break
+            return relevant_docs
         except Exception as e:
             logging.error(f"Error in retrieving relevant documents: {str(e)}")
             return []
@@ -155,7 +190,7 @@ class SimpleRAGChatbot:
                 if relevant_docs:
                     response += "\nHere are some relevant documents:\n"
                     for doc in relevant_docs:
-                        response += f"- {doc['content'][:50]}...\n"
+                        response += f"- {doc_preview(doc)[:50]}...\n"
                 else:
                     response += "\nI couldn't find any relevant documents."
 
@@ -254,34 +289,40 @@ def is_valid_pdf(file_path):
     """Check if the given file path is a valid PDF file."""
     return os.path.isfile(file_path) and file_path.lower().endswith('.pdf')
 
+def clean_latex_text(text):
+    # Clean up common LaTeX artifacts
+    text = re.sub(r'\\[a-zA-Z]+', '', text)  # Remove LaTeX commands
+    text = re.sub(r'\{|\}', '', text)  # Remove curly braces
+    text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
+    return text.strip()
+
 def read_latex_pdf(file_path):
-    """Read and process a LaTeX-generated PDF file."""
+    """Read and process a LaTeX-generated PDF file, one page at a time."""
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            # Clean up common LaTeX artifacts
-            text = re.sub(r'\\[a-zA-Z]+', '', text)  # Remove LaTeX commands
-            text = re.sub(r'\{|\}', '', text)  # Remove curly braces
-            text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-            
-            return text.strip()
+        return ' '.join(page for page in iter_pdf_pages(file_path, clean_latex_text) if page)
     except Exception as e:
         logging.error(f"Error reading PDF file '{file_path}': {str(e)}")
         raise
 
+# Keep the inverted index in step with every write to the database
+def index_document(doc_id, content):
+    doc_index.update(doc_id, preprocess_text(content), content_fingerprint(content))
+    doc_index.save()
+
+def unindex_document(doc_id):
+    doc_index.remove(doc_id)
+    doc_index.save()
+
 # Function to add a document to the database
 def add_document(content, category='default'):
     try:
-        db.insert({
+        doc_id = db.insert({
             'content': content,
             'timestamp': datetime.datetime.now().isoformat(),
             'category': category,
             'file_type': 'pdf' if content.startswith('PDF content:') else 'text'
         })
+        index_document(doc_id, content)
         print("Document added successfully.")
     except Exception as e:
         logging.error(f"Error adding document: {str(e)}")
@@ -301,7 +342,7 @@ def select_document(documents, title):
         result = []
         result.append(('bold', f"{title}\n\n"))
         
-        filtered_docs = [doc for doc in documents if search_query[0].lower() in doc['content'].lower()]
+        filtered_docs = [doc for doc in documents if search_query[0].lower() in doc_content(doc).lower()]
         filtered_docs.sort(key=lambda x: x[sort_by[0]], reverse=(sort_order[0] == 'desc'))
         
         start = page[0] * items_per_page
@@ -310,7 +351,7 @@ def select_document(documents, title):
         
         for i, doc in enumerate(current_page_docs, start=start):
             if i == selected_index[0]:
-                result.append(('reverse', f"> {doc['timestamp']}: {doc['content'][:50]}... [{doc.get('category', 'N/A')}]\n"))
+                result.append(('reverse', f"> {doc['timestamp']}: {doc_preview(doc)[:50]}... [{doc.get('category', 'N/A')}]\n"))
             else:
                 category_color = {
                     'default': '',
@@ -318,7 +359,7 @@ def select_document(documents, title):
                     'personal': '#ansigreen',
                     'work': '#ansiblue'
                 }.get(doc.get('category', 'default'), '')
-                result.append((category_color, f"  {doc['timestamp']}: {doc['content'][:50]}... [{doc.get('category', 'N/A')}]\n"))
+                result.append((category_color, f"  {doc['timestamp']}: {doc_preview(doc)[:50]}... [{doc.get('category', 'N/A')}]\n"))
         
         result.append(('', f"\nPage {page[0] + 1}/{(len(filtered_docs) - 1) // items_per_page + 1}"))
         result.append(('', "\nPress 'q' to return to main menu"))
@@ -367,7 +408,9 @@ def select_document(documents, title):
     @kb.add('c-d')
     def _(event):
         if 0 <= selected_index[0] < len(documents):
-            db.remove(doc_ids=[documents[selected_index[0]].doc_id])
+            doc_id = documents[selected_index[0]].doc_id
+            db.remove(doc_ids=[doc_id])
+            unindex_document(doc_id)
             documents.pop(selected_index[0])
             selected_index[0] = min(selected_index[0], len(documents) - 1)
 
@@ -375,10 +418,16 @@ def select_document(documents, title):
     def _(event):
         if 0 <= selected_index[0] < len(documents):
             doc = documents[selected_index[0]]
-            new_content = input(f"Edit document content (current: {doc['content']}): ")
+            new_content = input(f"Edit document content (current: {doc_content(doc)}): ")
             if new_content:
-                doc['content'] = new_content
-                db.update({'content': new_content}, doc_ids=[doc.doc_id])
+                if 'encrypted' in doc:
+                    # Written by main.py: store the new body the way main.py does (blob, preview, encryption)
+                    fields = body_fields(new_content, doc['encrypted'], blob_store, encryption)
+                else:
+                    fields = {'content': new_content}
+                replace_body(doc, fields)
+                db.update(lambda record: replace_body(record, fields), doc_ids=[doc.doc_id])
+                index_document(doc.doc_id, new_content)
 
     @kb.add('c-s')
     def _(event):
@@ -458,7 +507,7 @@ def search_documents(keyword):
             if selected_doc:
                 print("\nSelected document:")
                 print(f"Timestamp: {selected_doc['timestamp']}")
-                print(f"Content: {selected_doc['content']}")
+                print(f"Content: {doc_content(selected_doc)}")
             else:
                 print("Returned to main menu.")
         else:
@@ -476,7 +525,7 @@ def list_all_documents():
             if selected_doc:
                 print("\nSelected document:")
                 print(f"Timestamp: {selected_doc['timestamp']}")
-                print(f"Content: {selected_doc['content']}")
+                print(f"Content: {doc_content(selected_doc)}")
             else:
                 print("Returned to main menu.")
         else:
@@ -550,9 +599,10 @@ def delete_document():
 
         selected_doc = select_document(documents, "Select Document to Delete")
         if selected_doc:
-            confirm = input(f"Are you sure you want to delete this document? (y/n)\nContent: {selected_doc['content'][:50]}...\n")
+            confirm = input(f"Are you sure you want to delete this document? (y/n)\nContent: {doc_preview(selected_doc)[:50]}...\n")
             if confirm.lower() == 'y':
                 db.remove(doc_ids=[selected_doc.doc_id])
+                unindex_document(selected_doc.doc_id)
                 print("Document deleted successfully.")
             else:
                 print("Deletion cancelled.")
@@ -632,7 +682,7 @@ def nlp_mode():
             if documents:
                 selected_doc = select_document(documents, "Select Document for NLP Analysis")
                 if selected_doc:
-                    perform_nlp_tasks(selected_doc['content'])
+                    perform_nlp_tasks(doc_content(selected_doc))
                 else:
                     print("Returned to NLP menu.")
             else:
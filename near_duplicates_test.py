@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+# Regression check for near-duplicate marks when an original is edited or deleted.
+# Runs against a throwaway store in a temporary directory: python near_duplicates_test.py [tinydb|sqlite]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+import config
+if len(sys.argv) > 1:
+    config.STORAGE_BACKEND = sys.argv[1]
+
+import document_manager as dm
+
+def marks():
+    return {doc.doc_id: doc.get('duplicate_of') for doc in dm.db.all()}
+
+def found(query):
+    return sorted(doc.doc_id for doc in dm.search_documents(query))
+
+def main():
+    text = 'budget ' + ' '.join(f"item{i}" for i in range(60))
+    original, copy = dm.add_documents([{'content': text}, {'content': text + ' revised'}], encrypt=False)
+    assert marks()[copy] == original, marks()
+
+    # Editing the original away from the copy clears the copy's mark, so the copy is found again
+    dm.update_document(original, 'an unrelated note about gardening')
+    assert marks()[copy] is None, marks()
+    assert found('budget') == [copy], found('budget')
+
+    # Deleting an original clears the marks pointing at it, or moves them to the closest remaining match
+    other = dm.add_documents([{'content': text + ' again'}], encrypt=False)[0]
+    third = dm.add_documents([{'content': text + ' once more'}], encrypt=False)[0]
+    assert marks()[other] == copy and marks()[third] == copy, marks()
+    dm.delete_document(copy)
+    assert marks()[other] is None and marks()[third] == other, marks()
+    assert found('budget') == [other], found('budget')
+    dm.delete_document(other)
+    assert marks()[third] is None, marks()
+    assert found('budget') == [third], found('budget')
+    print(f"Near-duplicate marks follow edits and deletions ({config.STORAGE_BACKEND}).")
+
+main()
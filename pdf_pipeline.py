@@ -0,0 +1,305 @@
+import bisect
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from config import IMPORT_WORKERS, IMPORT_QUEUE_SIZE, IMPORT_BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP
+
+# Sentence-ending punctuation, optionally followed by closing quotes or brackets, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+def clean_pdf_text(text):
+    # Strip LaTeX commands left in the extracted text and collapse whitespace
+    text = re.sub(r'\\[a-zA-Z]+(\[.*?\])?(\{.*?\})?', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def iter_pdf_pages(file_path, clean=clean_pdf_text):
+    """Yield each page's cleaned text ('' for a page without any) as it is extracted.
+
+    Only one page's text is held at a time, however long the PDF.
+    """
+    with open(file_path, 'rb') as file:
+        for page in PyPDF2.PdfReader(file).pages:
+            yield clean(page.extract_text() or '')
+
+
+class PageCounter:
+    """Pass-through over a page stream that counts the pages seen so far."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.count = 0
+
+    def __iter__(self):
+        for page in self.pages:
+            self.count += 1
+            yield page
+
+
+def extract_pdf(file_path):
+    """Text of a PDF with LaTeX leftovers cleaned up, and its page count."""
+    pages = list(iter_pdf_pages(file_path))
+    return ' '.join(page for page in pages if page), len(pages)
+
+
+def iter_text_chunks(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Group a stream of page texts into chunks of whole sentences of up to `chunk_size` characters.
+
+    Pages are joined by single spaces (empty pages are skipped but still counted) and split
+    after sentence-ending punctuation. A sentence longer than a chunk is split between
+    words, and a longer word is cut. Each chunk starts with up to `overlap` characters of
+    trailing sentences from the chunk before. Yields {'content', 'pages', 'offsets'}:
+    pages is the 1-based [first, last] page and offsets is [start, end] in the joined text,
+    which content equals the slice of. Text is consumed as it arrives; only the chunk
+    being built and the unfinished sentence are held.
+    """
+    buf = ''
+    base = 0  # offset of buf[0] in the joined text
+    scan = 0  # text before this offset has been split into sentences
+    page_offsets, page_numbers = [], []
+    units = []  # (start, end) of the sentences in the chunk being built
+
+    def page_at(offset):
+        return page_numbers[bisect.bisect_right(page_offsets, offset) - 1]
+
+    def pieces(start, end):
+        while end - start > chunk_size:
+            space = buf.rfind(' ', start - base + 1, start - base + chunk_size + 1)
+            cut = base + space if space != -1 else start + chunk_size
+            yield start, cut
+            start = cut + 1 if space != -1 else cut
+        yield start, end
+
+    def emit():
+        start, end = units[0][0], units[-1][1]
+        return {'content': buf[start - base:end - base], 'pages': [page_at(start), page_at(end - 1)],
+                'offsets': [start, end]}
+
+    def add(unit):
+        nonlocal units
+        chunk = None
+        if units and unit[1] - units[0][0] > chunk_size:
+            chunk = emit()
+            # Carry trailing sentences over as overlap, keeping room for the new one
+            keep = len(units)
+            while (keep > 1 and units[-1][1] - units[keep - 1][0] <= overlap
+                   and unit[1] - units[keep - 1][0] <= chunk_size):
+                keep -= 1
+            units = units[keep:]
+        units.append(unit)
+        return chunk
+
+    started = False
+    for number, text in enumerate(pages, 1):
+        if not text:
+            continue
+        if started:
+            buf += ' '
+        started = True
+        page_offsets.append(base + len(buf))
+        page_numbers.append(number)
+        buf += text
+        for match in SENTENCE_END.finditer(buf, scan - base):
+            end = base + match.start() + len(match.group().rstrip())
+            for piece in pieces(scan, end):
+                chunk = add(piece)
+                if chunk:
+                    yield chunk
+            scan = base + match.end()
+        # A run-on sentence is not held back forever: cut it between words once it outgrows a chunk
+        while base + len(buf) - scan > chunk_size:
+            start, end = next(pieces(scan, base + len(buf)))
+            chunk = add((start, end))
+            if chunk:
+                yield chunk
+            scan = end + 1 if buf[end - base:end - base + 1] == ' ' else end
+        # Drop text no chunk can still need
+        keep_from = units[0][0] if units else scan
+        buf, base = buf[keep_from - base:], keep_from
+        first = max(bisect.bisect_right(page_offsets, base) - 1, 0)
+        del page_offsets[:first], page_numbers[:first]
+    tail = base + len(buf.rstrip())
+    if tail > scan:
+        for piece in pieces(scan, tail):
+            chunk = add(piece)
+            if chunk:
+                yield chunk
+    if units:
+        yield emit()
+
+
+def iter_pdf_documents(pages, category='default', chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, source=None):
+    """Chunk documents ready for add_documents(), produced as `pages` (e.g. iter_pdf_pages()) arrive.
+
+    Each carries its page range and offsets, and the `source` path when given, so a source
+    can later be re-chunked or re-indexed from the stored chunks.
+    """
+    for n, chunk in enumerate(iter_text_chunks(pages, chunk_size, overlap)):
+        chunk.update(category=category, file_type=f'pdf_chunk_{n + 1}')
+        if source:
+            chunk['source'] = source
+        yield chunk
+
+
+def file_hash(file_path, key):
+    """Keyed SHA-256 of a file's bytes, read in blocks."""
+    digest = hmac.new(key, digestmod=hashlib.sha256)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImportManifest:
+    """Size, mtime and content hash of every imported file, kept in a JSON file.
+
+    A file whose size and mtime still match is skipped on a stat alone; one that was only
+    touched is caught by its hash before any extraction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"Error loading import manifest '{path}', starting empty: {str(e)}")
+
+    def unchanged(self, file_path, stat):
+        entry = self.entries.get(file_path)
+        return entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def known_hash(self, file_path):
+        return self.entries.get(file_path, {}).get('hash')
+
+    def record(self, file_path, stat, content_hash):
+        self.entries[file_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': content_hash}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_file(file_path, category, chunk_size, overlap, hash_key=None, known_hash=None):
+    """Runs in a pool process: one file to chunk documents, or the error that stopped it.
+
+    Returns (file_path, documents, pages, error, content_hash); a bad file never takes the
+    batch down. documents is None when the file's hash equals `known_hash`.
+    """
+    try:
+        content_hash = file_hash(file_path, hash_key) if hash_key else None
+        if known_hash and content_hash == known_hash:
+            return file_path, None, 0, None, content_hash
+        if file_path.endswith('.pdf'):
+            counter = PageCounter(iter_pdf_pages(file_path))
+            documents = list(iter_pdf_documents(counter, category, chunk_size, overlap, source=file_path))
+            pages = counter.count
+        else:
+            with open(file_path, 'r') as f:
+                content = f.read()
+            documents = [{'content': content, 'category': category, 'source': file_path, 'pages': [1, 1],
+                          'offsets': [0, len(content)]}]
+            pages = 0
+        return file_path, documents, pages, None, content_hash
+    except Exception as e:
+        return file_path, [], 0, f"{type(e).__name__}: {str(e)}", None
+
+
+def run_import(file_paths, write, category='default', chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP,
+               workers=IMPORT_WORKERS, queue_size=IMPORT_QUEUE_SIZE, batch_size=IMPORT_BATCH_SIZE,
+               manifest=None, hash_key=None, progress=None):
+    """Extract files in a process pool and hand their chunks to `write` in file order.
+
+    Workers extract and chunk; this process is the single writer, calling
+    `write(documents)` with batches of about `batch_size` chunks (a file's chunks always
+    arrive in one call) and counting the doc_ids it returns as stored. At most
+    `queue_size` files are extracted ahead of the writer, which bounds memory and lets a
+    slow writer hold the pool back. A file that fails to extract is logged and skipped.
+    `progress(done, total)` is called as files are written.
+
+    With an ImportManifest (and `hash_key` for file hashes), files unchanged since they
+    were last imported are skipped, and each file is recorded once its chunks are written.
+
+    Returns a report dict: files, unchanged, failed ([(path, error)]), pages, chunks,
+    seconds, files_per_sec and pages_per_sec.
+    """
+    file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+    start = time.perf_counter()
+    report = {'files': 0, 'unchanged': 0, 'failed': [], 'pages': 0, 'chunks': 0}
+    batch, batch_files = [], []
+
+    def flush():
+        if batch:
+            report['chunks'] += len(write(list(batch)))
+            batch.clear()
+        if manifest is not None and batch_files:
+            for file_path, stat, content_hash in batch_files:
+                manifest.record(file_path, stat, content_hash)
+            manifest.save()
+        batch_files.clear()
+
+    def consume(stat, result):
+        file_path, documents, pages, error, content_hash = result
+        if error:
+            logging.error(f"Error importing '{file_path}': {error}")
+            report['failed'].append((file_path, error))
+        else:
+            if documents is None:
+                report['unchanged'] += 1
+            else:
+                report['files'] += 1
+                report['pages'] += pages
+                batch.extend(documents)
+            batch_files.append((file_path, stat, content_hash))
+            if len(batch) >= batch_size:
+                flush()
+        if progress:
+            progress(report['files'] + report['unchanged'] + len(report['failed']), len(file_paths))
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                consume(None, (file_path, [], 0, str(e), None))
+                continue
+            if manifest is not None and manifest.unchanged(file_path, stat):
+                report['unchanged'] += 1
+                continue
+            known_hash = manifest.known_hash(file_path) if manifest is not None else None
+            pending.append((stat, pool.submit(load_file, file_path, category, chunk_size, overlap,
+                                              hash_key, known_hash)))
+            if len(pending) >= max(queue_size, workers):
+                stat, future = pending.popleft()
+                consume(stat, future.result())
+        while pending:
+            stat, future = pending.popleft()
+            consume(stat, future.result())
+    flush()
+
+    report['seconds'] = elapsed = time.perf_counter() - start
+    report['files_per_sec'] = report['files'] / elapsed if elapsed else 0.0
+    report['pages_per_sec'] = report['pages'] / elapsed if elapsed else 0.0
+    logging.info(f"Imported {report['files']} files ({report['pages']} pages, {report['chunks']} chunks) "
+                 f"in {elapsed:.1f}s: {report['files_per_sec']:.1f} files/s, {report['pages_per_sec']:.1f} pages/s, "
+                 f"{report['unchanged']} unchanged, {len(report['failed'])} failed")
+    return report
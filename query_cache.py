@@ -0,0 +1,67 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """LRU + TTL cache for search results, invalidated by a corpus generation counter.
+
+    Every write to the corpus calls bump(), which makes all earlier entries stale without
+    walking the cache; stale entries are dropped lazily when looked up or evicted. Values
+    are copied on the way out so callers can mutate results without corrupting the cache.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires, value = entry
+                if generation == self.generation and expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+            self.misses += 1
+            generation = self.generation
+        value = compute()
+        with self._lock:
+            # A write that landed while computing makes this result stale already; don't keep it
+            if generation == self.generation and self.maxsize > 0:
+                self._entries[key] = (generation, now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return copy.deepcopy(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'generation': self.generation,
+            }
@@ -0,0 +1,692 @@
+import heapq
+import json
+import logging
+import math
+import os
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from config import BM25_K1, BM25_B, INDEX_LOG_MIN_OPS
+from fuzzywuzzy import fuzz, utils as fuzz_utils
+
+
+def content_fingerprint(content):
+    """Cheap checksum used to notice documents that changed behind the index's back."""
+    if not isinstance(content, bytes):
+        content = str(content).encode('utf-8')
+    return zlib.crc32(content)
+
+def stored_fingerprint(record):
+    """Fingerprint of a record's stored body: inline content, or its blob reference (bodies are never rewritten)."""
+    if 'content' in record:
+        return content_fingerprint(record['content'])
+    return content_fingerprint(f"blob:{record['blob'][0]}:{record['blob'][1]}")
+
+
+class LoggedIndex:
+    """Per-document index persisted as JSON (optionally encrypted) next to the database.
+
+    The file at `path` is a snapshot; save() appends the documents changed since the last
+    save to `<path>.log` as one line (encrypted like the snapshot when there is a cipher)
+    and only rewrites the snapshot once the log holds more changes than the index holds
+    documents (and at least `log_min_ops`), so a write costs about its own size. load()
+    replays the log over the snapshot; an unreadable last line from an interrupted write
+    is dropped.
+
+    Subclasses record each document's change in `_changes` (None for a removal) and
+    implement to_dict(), load_dict(), apply_change() and __len__().
+    """
+
+    def __init__(self, path=None, cipher=None, log_min_ops=INDEX_LOG_MIN_OPS):
+        self.path = path
+        # Optional Fernet-style cipher: the files are then encrypted, compressed blobs
+        self.cipher = cipher
+        self.log_min_ops = log_min_ops
+        # doc_id -> change since the last save
+        self._changes = {}
+        # Changes in the log on top of the snapshot; None until a snapshot has been written or read
+        self._log_ops = None
+
+    def apply_change(self, doc_id, change):
+        raise NotImplementedError
+
+    def __getstate__(self):
+        # A pickled copy (e.g. for a spawned pool worker) is read-only: it gets no path to save to and no key
+        return dict(self.__dict__, path=None, cipher=None, _changes={})
+
+    def _encode(self, data):
+        data = json.dumps(data).encode('utf-8')
+        if self.cipher is not None:
+            data = self.cipher.encrypt(zlib.compress(data))
+        return data
+
+    def _decode(self, data):
+        # A plain JSON file (written without a cipher) is still read; the next snapshot encrypts it
+        if self.cipher is not None and not data.startswith(b'{'):
+            data = zlib.decompress(self.cipher.decrypt(data))
+        return json.loads(data)
+
+    def save(self):
+        if not self.path:
+            return
+        if self._log_ops is None or self._log_ops + len(self._changes) > max(self.log_min_ops, len(self)):
+            self.save_snapshot()
+        elif self._changes:
+            # Fernet tokens are base64, so one change set per line
+            with open(f"{self.path}.log", 'ab') as f:
+                f.write(self._encode({str(doc_id): change for doc_id, change in self._changes.items()}) + b'\n')
+            self._log_ops += len(self._changes)
+            self._changes = {}
+
+    def save_snapshot(self):
+        """Rewrite the whole index file and empty the log."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._encode(self.to_dict()))
+        os.replace(tmp_path, self.path)
+        # Replaying changes already in the snapshot is harmless, so a crash before this is too
+        if os.path.exists(f"{self.path}.log"):
+            os.remove(f"{self.path}.log")
+        self._changes = {}
+        self._log_ops = 0
+
+    def _replay(self):
+        log_path = f"{self.path}.log"
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        for raw in data.splitlines(keepends=True):
+            try:
+                changes = self._decode(raw.strip())
+            except Exception:
+                logging.error(f"Dropping unreadable log tail of '{log_path}' at byte {offset}")
+                with open(log_path, 'r+b') as f:
+                    f.truncate(offset)
+                break
+            for doc_id, change in changes.items():
+                self.apply_change(int(doc_id), change)
+            self._log_ops += len(changes)
+            offset += len(raw)
+
+    @classmethod
+    def load(cls, path, cipher=None):
+        index = cls(path, cipher)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    index.load_dict(index._decode(f.read()))
+                index._log_ops = 0
+                index._replay()
+                index._changes = {}
+            except Exception as e:
+                logging.error(f"Error loading index '{path}', rebuilding: {str(e)}")
+                index = cls(path, cipher)
+        return index
+
+
+class InvertedIndex(LoggedIndex):
+    """Term -> {doc_id: term frequency} postings; a logged change is [term_freqs, fingerprint]."""
+
+    def __init__(self, path=None, cipher=None, log_min_ops=INDEX_LOG_MIN_OPS):
+        super().__init__(path, cipher, log_min_ops)
+        self.postings = {}
+        self.doc_lengths = {}
+        self.fingerprints = {}
+        # Forward map so removals only touch the document's own postings.
+        self.doc_terms = {}
+        self.total_length = 0
+        # term -> impact-ordered postings split into blocks; dropped whenever the term changes
+        self._impact_blocks = {}
+        # Supplies avgdl and idf() when this index is one shard of a larger collection
+        self.collection = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def __getstate__(self):
+        # The impact blocks are a cache; the copy rebuilds the ones its queries need
+        return dict(super().__getstate__(), _impact_blocks={})
+
+    def add(self, doc_id, tokens, fingerprint=None):
+        self.add_terms(doc_id, Counter(tokens), fingerprint)
+
+    def add_terms(self, doc_id, term_freqs, fingerprint=None):
+        """Index a document from its precomputed {term: frequency} bag."""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+            self._impact_blocks.pop(term, None)
+        length = sum(term_freqs.values())
+        self._changes[doc_id] = [dict(term_freqs), fingerprint]
+        self.doc_terms[doc_id] = list(term_freqs)
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        if fingerprint is not None:
+            self.fingerprints[doc_id] = fingerprint
+
+    def remove(self, doc_id):
+        if doc_id not in self.doc_lengths:
+            return
+        for term in self.doc_terms.pop(doc_id, ()):
+            self._impact_blocks.pop(term, None)
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.fingerprints.pop(doc_id, None)
+        self._changes[doc_id] = None
+
+    def term_freqs(self, doc_id):
+        return {term: self.postings[term][doc_id] for term in self.doc_terms.get(doc_id, ())}
+
+    def update(self, doc_id, tokens, fingerprint=None):
+        self.remove(doc_id)
+        self.add(doc_id, tokens, fingerprint)
+
+    def match(self, tokens):
+        """Count, per document, how many of the query tokens it contains."""
+        scores = Counter()
+        for token in tokens:
+            for doc_id in self.postings.get(token, ()):
+                scores[doc_id] += 1
+        return scores
+
+    @property
+    def avgdl(self):
+        return self.total_length / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def idf(self, term):
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def bm25(self, tokens, k=None, k1=BM25_K1, b=BM25_B, only=None):
+        """Rank documents against the query tokens with Okapi BM25.
+
+        Returns (doc_id, score) pairs, best first; only the top `k` when given, and only
+        documents in the set `only` when given.
+        """
+        return self.bm25_batch([tokens], k, k1, b, only)[0]
+
+    def bm25_batch(self, queries, k=None, k1=BM25_K1, b=BM25_B, only=None):
+        """BM25 for many queries at once: each distinct term's postings are walked only once."""
+        collection = self.collection or self
+        avgdl = collection.avgdl or 1.0
+        term_queries = {}
+        for qi, tokens in enumerate(queries):
+            for term, qtf in Counter(tokens).items():
+                term_queries.setdefault(term, []).append((qi, qtf))
+        scores = [{} for _ in queries]
+        for term, users in term_queries.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = collection.idf(term)
+            for doc_id, tf in postings.items():
+                if only is not None and doc_id not in only:
+                    continue
+                weight = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * self.doc_lengths[doc_id] / avgdl))
+                for qi, qtf in users:
+                    query_scores = scores[qi]
+                    query_scores[doc_id] = query_scores.get(doc_id, 0.0) + qtf * weight
+        key = lambda item: (item[1], -item[0])
+        if k is None:
+            return [sorted(query_scores.items(), key=key, reverse=True) for query_scores in scores]
+        return [heapq.nlargest(k, query_scores.items(), key=key) for query_scores in scores]
+
+    def impact_blocks(self, term, k1=BM25_K1, b=BM25_B, block_size=64):
+        """Postings of `term` ordered by BM25 impact, as blocks of (doc_ids, max tf, min doc length).
+
+        The order uses avgdl at build time, but block bounds are recomputed from max tf and min
+        length at query time, so they stay safe as avgdl drifts and only terms whose postings
+        change need re-sorting.
+        """
+        blocks = self._impact_blocks.get(term)
+        if blocks is None:
+            postings = self.postings.get(term, {})
+            avgdl = self.avgdl or 1.0
+            ordered = sorted(postings, key=lambda doc_id: (
+                -postings[doc_id] / (postings[doc_id] + k1 * (1 - b + b * self.doc_lengths[doc_id] / avgdl)), doc_id))
+            blocks = []
+            for start in range(0, len(ordered), block_size):
+                block = ordered[start:start + block_size]
+                blocks.append((block, max(postings[doc_id] for doc_id in block),
+                               min(self.doc_lengths[doc_id] for doc_id in block)))
+            self._impact_blocks[term] = blocks
+        return blocks
+
+    def bm25_topk(self, tokens, k, k1=BM25_K1, b=BM25_B):
+        """Exact BM25 top-k with block-max MaxScore pruning.
+
+        Terms are visited from the highest upper bound down, each through its impact-ordered
+        blocks. A block is abandoned once its bound plus every other term's bound cannot
+        beat the current k-th score, and the remaining terms are dropped once their bounds
+        together cannot. Documents are scored exactly (dict lookups per query term) the first
+        time they are seen. Returns (results, stats) where results match bm25(tokens, k) and
+        stats counts documents scored and postings skipped without being looked at.
+        """
+        collection = self.collection or self
+        avgdl = collection.avgdl or 1.0
+        query = Counter(token for token in tokens if token in self.postings)
+
+        def impact(tf, length):
+            return tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avgdl))
+
+        terms = []
+        weights = {}
+        for term, qtf in query.items():
+            weight = weights[term] = qtf * collection.idf(term)
+            bounds = [weight * impact(max_tf, min_len) for _, max_tf, min_len in self.impact_blocks(term, k1, b)]
+            # Suffix maxima: bound on every posting from this block onward
+            for i in range(len(bounds) - 2, -1, -1):
+                bounds[i] = max(bounds[i], bounds[i + 1])
+            terms.append((bounds[0], term, weight, bounds))
+        terms.sort(key=lambda t: -t[0])
+        total_bound = sum(t[0] for t in terms)
+        candidates = sum(len(self.postings[term]) for term in query)
+
+        heap = []
+        seen = set()
+        scored = examined = 0
+        # Scores are summed in a different order than the bounds; keep pruning conservative
+        slack = 1 + 1e-9
+
+        def threshold():
+            return heap[0][0] if len(heap) == k else -math.inf
+
+        remaining_bound = total_bound
+        for max_bound, term, weight, bounds in terms:
+            if remaining_bound * slack < threshold():
+                break
+            others = total_bound - max_bound
+            for (block, _, _), block_bound in zip(self.impact_blocks(term, k1, b), bounds):
+                if (block_bound + others) * slack < threshold():
+                    break
+                examined += len(block)
+                for doc_id in block:
+                    if doc_id in seen:
+                        continue
+                    seen.add(doc_id)
+                    scored += 1
+                    length = self.doc_lengths[doc_id]
+                    score = 0.0
+                    for other_term, other_weight in weights.items():
+                        tf = self.postings[other_term].get(doc_id)
+                        if tf:
+                            score += other_weight * impact(tf, length)
+                    entry = (score, -doc_id)
+                    if len(heap) < k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+            remaining_bound -= max_bound
+
+        results = [(-neg_id, score) for score, neg_id in sorted(heap, reverse=True)]
+        return results, {'scored': scored, 'skipped': candidates - examined, 'candidates': candidates}
+
+    def sync(self, db, terms_of):
+        """Bring the index in line with `db`, re-reading only new or changed documents.
+
+        `terms_of(doc)` maps a stored record to its {term: frequency} bag.
+        """
+        seen = set()
+        changed = False
+        for doc in db:
+            seen.add(doc.doc_id)
+            fingerprint = stored_fingerprint(doc)
+            if self.fingerprints.get(doc.doc_id) != fingerprint or doc.doc_id not in self.doc_lengths:
+                try:
+                    term_freqs = terms_of(doc)
+                except Exception as e:
+                    logging.error(f"Error indexing document {doc.doc_id}: {str(e)}")
+                    continue
+                self.add_terms(doc.doc_id, term_freqs, fingerprint)
+                changed = True
+        for doc_id in set(self.doc_lengths) - seen:
+            self.remove(doc_id)
+            changed = True
+        if changed:
+            self.save()
+
+    def to_dict(self):
+        return {
+            'postings': {term: {str(doc_id): tf for doc_id, tf in postings.items()}
+                         for term, postings in self.postings.items()},
+            'doc_lengths': {str(doc_id): length for doc_id, length in self.doc_lengths.items()},
+            'fingerprints': {str(doc_id): fp for doc_id, fp in self.fingerprints.items()},
+        }
+
+    def load_dict(self, data):
+        self.postings = {term: {int(doc_id): tf for doc_id, tf in postings.items()}
+                         for term, postings in data.get('postings', {}).items()}
+        self.doc_lengths = {int(doc_id): length for doc_id, length in data.get('doc_lengths', {}).items()}
+        self.fingerprints = {int(doc_id): fp for doc_id, fp in data.get('fingerprints', {}).items()}
+        self.total_length = sum(self.doc_lengths.values())
+        self._impact_blocks = {}
+        self.doc_terms = {doc_id: [] for doc_id in self.doc_lengths}
+        for term, postings in self.postings.items():
+            for doc_id in postings:
+                self.doc_terms.setdefault(doc_id, []).append(term)
+
+    def apply_change(self, doc_id, change):
+        if change is None:
+            self.remove(doc_id)
+        else:
+            self.add_terms(doc_id, change[0], change[1])
+
+
+# Set in each process of a search pool by init_search_worker()
+_worker_index = None
+
+
+def init_search_worker(index):
+    """Pool initializer: the index is handed over explicitly (inherited on fork, pickled under spawn)."""
+    global _worker_index
+    _worker_index = index
+
+
+def bm25_batch_worker(queries, k):
+    return _worker_index.bm25_batch(queries, k)
+
+
+def shard_paths(path, count):
+    base, ext = os.path.splitext(path)
+    return [f"{base}.shard{i}of{count}{ext}" for i in range(count)]
+
+
+class ShardedIndex:
+    """InvertedIndex split by doc_id % count into files that load in parallel and save independently.
+
+    Writes only mark their shard dirty, so save() rewrites just the shards that changed.
+    Queries fan out to every shard and merge the per-shard top-k; the shards score with
+    collection-wide avgdl and idf (they point their `collection` here), so results are
+    the same as from one unsharded index.
+    """
+
+    def __init__(self, path, count, workers=None, cipher=None):
+        self.path = path
+        with ThreadPoolExecutor(workers or count) as pool:
+            self.shards = list(pool.map(lambda shard_path: InvertedIndex.load(shard_path, cipher),
+                                        shard_paths(path, count)))
+        for shard in self.shards:
+            shard.collection = self
+        self._dirty = set()
+
+    def shard_of(self, doc_id):
+        return self.shards[doc_id % len(self.shards)]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.shard_of(doc_id)
+
+    def add(self, doc_id, tokens, fingerprint=None):
+        self.add_terms(doc_id, Counter(tokens), fingerprint)
+
+    def add_terms(self, doc_id, term_freqs, fingerprint=None):
+        self.shard_of(doc_id).add_terms(doc_id, term_freqs, fingerprint)
+        self._dirty.add(doc_id % len(self.shards))
+
+    def remove(self, doc_id):
+        self.shard_of(doc_id).remove(doc_id)
+        self._dirty.add(doc_id % len(self.shards))
+
+    def update(self, doc_id, tokens, fingerprint=None):
+        self.remove(doc_id)
+        self.add(doc_id, tokens, fingerprint)
+
+    def term_freqs(self, doc_id):
+        return self.shard_of(doc_id).term_freqs(doc_id)
+
+    # Merged views over all shards; built on each access, so meant for startup and rebuilds
+    @property
+    def doc_lengths(self):
+        return {doc_id: length for shard in self.shards for doc_id, length in shard.doc_lengths.items()}
+
+    @property
+    def doc_terms(self):
+        return {doc_id: terms for shard in self.shards for doc_id, terms in shard.doc_terms.items()}
+
+    @property
+    def fingerprints(self):
+        return {doc_id: fp for shard in self.shards for doc_id, fp in shard.fingerprints.items()}
+
+    @property
+    def postings(self):
+        merged = {}
+        for shard in self.shards:
+            for term, postings in shard.postings.items():
+                merged.setdefault(term, {}).update(postings)
+        return merged
+
+    @property
+    def avgdl(self):
+        count = len(self)
+        return sum(shard.total_length for shard in self.shards) / count if count else 0.0
+
+    def idf(self, term):
+        df = sum(len(shard.postings.get(term, ())) for shard in self.shards)
+        n = len(self)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def bm25(self, tokens, k=None, k1=BM25_K1, b=BM25_B, only=None):
+        return self.bm25_batch([tokens], k, k1, b, only)[0]
+
+    def bm25_batch(self, queries, k=None, k1=BM25_K1, b=BM25_B, only=None):
+        per_shard = [shard.bm25_batch(queries, k, k1, b, only) for shard in self.shards]
+        key = lambda item: (item[1], -item[0])
+        results = []
+        for qi in range(len(queries)):
+            hits = [hit for shard_hits in per_shard for hit in shard_hits[qi]]
+            results.append(sorted(hits, key=key, reverse=True) if k is None else heapq.nlargest(k, hits, key=key))
+        return results
+
+    def bm25_topk(self, tokens, k, k1=BM25_K1, b=BM25_B):
+        """Fan out to every shard's pruned top-k and merge; stats are summed over the shards."""
+        hits = []
+        stats = Counter()
+        for shard in self.shards:
+            shard_hits, shard_stats = shard.bm25_topk(tokens, k, k1, b)
+            hits.extend(shard_hits)
+            stats.update(shard_stats)
+        return heapq.nlargest(k, hits, key=lambda item: (item[1], -item[0])), dict(stats)
+
+    def sync(self, db, terms_of):
+        """Sync each shard against its own slice of `db`."""
+        slices = [[] for _ in self.shards]
+        for doc in db:
+            slices[doc.doc_id % len(self.shards)].append(doc)
+        for shard, docs in zip(self.shards, slices):
+            shard.sync(docs, terms_of)
+
+    def save(self):
+        for i in sorted(self._dirty):
+            self.shards[i].save()
+        self._dirty.clear()
+
+
+class FuzzyCandidateIndex(LoggedIndex):
+    """Prunes fuzz.token_set_ratio search to documents that can still reach the threshold.
+
+    token_set_ratio only has two cases. If query and document share a token, the document
+    is found through the token postings. If they share none, the score is exactly
+    ratio(Q, D) over the sorted, space-joined token strings, which is bounded by
+    2 * min(len(Q), len(D), shared character counts) / (len(Q) + len(D)). So a document
+    needs at least T characters in common with the query, T set by the threshold and
+    the shortest length that can still pass.
+
+    Character counts are indexed as count-filter postings: (char, length bucket) ->
+    {count: doc_ids}, where "d has at least k of c" is one key per occurrence. A document
+    sharing T of the query's len(Q) keys is in at least one of its len(Q) - T + 1 rarest
+    key lists, so only those lists (within the length band) are read, and the candidates
+    are checked against the exact bound. No document scoring at or above the threshold
+    is ever skipped, and a query reads postings in proportion to how common its rarest
+    characters are rather than to the corpus size.
+
+    Persisted like InvertedIndex: a logged change is [tokens, fingerprint], where tokens are
+    already normalized, so loading never re-runs fuzzywuzzy's processing on the vocabulary.
+    """
+
+    def __init__(self, path=None, cipher=None, log_min_ops=INDEX_LOG_MIN_OPS):
+        super().__init__(path, cipher, log_min_ops)
+        self.postings = {}
+        self.doc_tokens = {}
+        self.fingerprints = {}
+        self.lengths = {}
+        self.char_counts = {}
+        self.char_postings = {}
+
+    def __len__(self):
+        return len(self.doc_tokens)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_tokens
+
+    @staticmethod
+    def normalize(terms):
+        # Mirror the processing token_set_ratio applies, so bounds are computed on the same strings
+        tokens = set()
+        for term in terms:
+            tokens.update(fuzz_utils.full_process(term, force_ascii=True).split())
+        return frozenset(tokens)
+
+    @staticmethod
+    def length_bucket(length):
+        return length.bit_length()
+
+    def add(self, doc_id, terms, fingerprint=None):
+        self.add_tokens(doc_id, self.normalize(terms), fingerprint)
+
+    def add_tokens(self, doc_id, tokens, fingerprint=None):
+        """Index already normalized tokens."""
+        if doc_id in self.doc_tokens:
+            self.remove(doc_id)
+        tokens = frozenset(tokens)
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(doc_id)
+        joined = ' '.join(sorted(tokens))
+        chars = Counter(joined)
+        bucket = self.length_bucket(len(joined))
+        for char, count in chars.items():
+            self.char_postings.setdefault((char, bucket), {}).setdefault(count, set()).add(doc_id)
+        self.doc_tokens[doc_id] = tokens
+        self.lengths[doc_id] = len(joined)
+        self.char_counts[doc_id] = chars
+        if fingerprint is not None:
+            self.fingerprints[doc_id] = fingerprint
+        self._changes[doc_id] = [sorted(tokens), fingerprint]
+
+    def remove(self, doc_id):
+        tokens = self.doc_tokens.pop(doc_id, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self.postings[token]
+        bucket = self.length_bucket(self.lengths.pop(doc_id))
+        for char, count in self.char_counts.pop(doc_id).items():
+            by_count = self.char_postings[char, bucket]
+            by_count[count].discard(doc_id)
+            if not by_count[count]:
+                del by_count[count]
+                if not by_count:
+                    del self.char_postings[char, bucket]
+        self.fingerprints.pop(doc_id, None)
+        self._changes[doc_id] = None
+
+    def apply_change(self, doc_id, change):
+        if change is None:
+            self.remove(doc_id)
+        else:
+            self.add_tokens(doc_id, change[0], change[1])
+
+    def to_dict(self):
+        return {'docs': {str(doc_id): [sorted(tokens), self.fingerprints.get(doc_id)]
+                         for doc_id, tokens in self.doc_tokens.items()}}
+
+    def load_dict(self, data):
+        for doc_id, (tokens, fingerprint) in data.get('docs', {}).items():
+            self.add_tokens(int(doc_id), tokens, fingerprint)
+
+    def sync(self, doc_terms, fingerprints):
+        """Bring the index in line with {doc_id: terms}, re-normalizing only new or changed documents."""
+        for doc_id, terms in doc_terms.items():
+            if doc_id not in self.doc_tokens or self.fingerprints.get(doc_id) != fingerprints.get(doc_id):
+                self.add(doc_id, terms, fingerprints.get(doc_id))
+        for doc_id in set(self.doc_tokens) - set(doc_terms):
+            self.remove(doc_id)
+        if self._changes:
+            self.save()
+
+    def _char_candidates(self, query_chars, lq, low, high, needed):
+        """Documents of length low..high holding at least `needed` of the query's character occurrences."""
+        buckets = range(self.length_bucket(low), self.length_bucket(high) + 1)
+        keys = []
+        for char, count in query_chars.items():
+            by_count = [self.char_postings.get((char, bucket), {}) for bucket in buckets]
+            for k in range(1, count + 1):
+                size = sum(len(docs) for postings in by_count for c, docs in postings.items() if c >= k)
+                keys.append((size, char, k))
+        keys.sort()
+        # The smallest k chosen per character covers the larger ones, whose lists it contains
+        least = {}
+        for _, char, k in keys[:max(lq - needed + 1, 0)]:
+            least[char] = min(k, least.get(char, k))
+        found = set()
+        for char, k in least.items():
+            for bucket in buckets:
+                for count, docs in self.char_postings.get((char, bucket), {}).items():
+                    if count >= k:
+                        found.update(docs)
+        return found
+
+    def candidates(self, query_terms, threshold):
+        query_tokens = self.normalize(query_terms)
+        if not query_tokens:
+            return set()
+        found = set()
+        for token in query_tokens:
+            found.update(self.postings.get(token, ()))
+
+        # fuzz rounds 100 * ratio, so anything that can round up to the threshold must be kept
+        r = (threshold - 0.5) / 100
+        if r <= 0:
+            return set(self.doc_tokens)
+        query_string = ' '.join(sorted(query_tokens))
+        lq = len(query_string)
+        query_chars = Counter(query_string)
+        low = math.floor(lq * r / (2 - r))
+        high = math.ceil(lq * (2 - r) / r)
+        # Rounded down (never more than the bound asks) and at least one shared character
+        needed = max(1, math.floor(r * (lq + low) / 2))
+        for doc_id in self._char_candidates(query_chars, lq, low, high, needed) - found:
+            length = self.lengths[doc_id]
+            if not low <= length <= high:
+                continue
+            doc_chars = self.char_counts[doc_id]
+            shared = sum(min(count, doc_chars.get(char, 0)) for char, count in query_chars.items())
+            if 2 * min(shared, lq, length) >= r * (lq + length):
+                found.add(doc_id)
+        return found
+
+    def search(self, query_terms, threshold=70):
+        """Return (doc_id, token_set_ratio) pairs at or above `threshold`, best first."""
+        query_tokens = set(query_terms)
+        results = []
+        for doc_id in self.candidates(query_terms, threshold):
+            similarity = fuzz.token_set_ratio(query_tokens, set(self.doc_tokens[doc_id]))
+            if similarity >= threshold:
+                results.append((doc_id, similarity))
+        return sorted(results, key=lambda x: (-x[1], x[0]))
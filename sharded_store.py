@@ -0,0 +1,149 @@
+import glob
+import heapq
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tinydb import TinyDB
+from tinydb.table import Document
+
+from config import DB_SHARDS, DB_LOAD_WORKERS
+from log_storage import AppendLogStorage
+from search_index import shard_paths
+from write_behind import WriteBehindMiddleware
+
+
+def open_shard(path):
+    return TinyDB(path, storage=WriteBehindMiddleware(AppendLogStorage))
+
+
+class ShardedStore:
+    """Documents spread over `count` TinyDB files by doc_id % count, opened in parallel.
+
+    Each shard is its own append-only log behind write-behind buffering, so a write,
+    flush or compaction touches one file and leaves the others alone. The store hands
+    out doc_ids itself (one sequence across all shards) and implements the part of
+    TinyDB's table API that the apps use, returning tinydb Documents.
+
+    A plain documents.json, or shards written with a different count, are redistributed
+    into the configured layout on open; the old files are kept with a .bak suffix.
+    """
+
+    def __init__(self, path, count=DB_SHARDS, workers=DB_LOAD_WORKERS):
+        self.path = path
+        self.paths = shard_paths(path, count)
+        self._lock = threading.RLock()
+        legacy = self._legacy_files()
+        with ThreadPoolExecutor(workers or count) as pool:
+            self.shards = list(pool.map(open_shard, self.paths))
+        if legacy:
+            self._reshard(legacy, workers or count)
+        self._next_id = max((max(map(int, shard.storage.read().get(shard.default_table_name, {})), default=0)
+                             for shard in self.shards), default=0) + 1
+
+    def _legacy_files(self):
+        base, ext = os.path.splitext(self.path)
+        pattern = re.compile(re.escape(base) + r'\.shard\d+of\d+' + re.escape(ext) + '$')
+        others = [path for path in glob.glob(f"{glob.escape(base)}.shard*of*{ext}")
+                  if pattern.match(path) and path not in self.paths]
+        if os.path.exists(self.path):
+            others.append(self.path)
+        return sorted(others)
+
+    def _reshard(self, files, workers):
+        def read(path):
+            db = TinyDB(path, storage=AppendLogStorage)
+            try:
+                return db.all()
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(workers) as pool:
+            docs = [doc for docs in pool.map(read, files) for doc in docs]
+        # Skip documents an interrupted earlier run already copied over
+        docs = [doc for doc in docs if not self.shard_of(doc.doc_id).contains(doc_id=doc.doc_id)]
+        self._insert_documents(docs)
+        self.flush()
+        for path in files:
+            os.replace(path, f"{path}.bak")
+        logging.info(f"Redistributed {len(docs)} documents from {len(files)} file(s) into {len(self.shards)} shards")
+
+    def shard_of(self, doc_id):
+        return self.shards[doc_id % len(self.shards)]
+
+    def _group(self, doc_ids):
+        groups = {}
+        for doc_id in doc_ids:
+            groups.setdefault(doc_id % len(self.shards), []).append(doc_id)
+        return groups
+
+    def _insert_documents(self, docs):
+        groups = {}
+        for doc in docs:
+            groups.setdefault(doc.doc_id % len(self.shards), []).append(doc)
+        for i, group in groups.items():
+            self.shards[i].insert_multiple(group)
+
+    def insert(self, record):
+        return self.insert_multiple([record])[0]
+
+    def insert_multiple(self, records):
+        """Insert with one write per affected shard; Documents keep their doc_id, as in TinyDB."""
+        with self._lock:
+            docs = []
+            for record in records:
+                if isinstance(record, Document):
+                    doc = record
+                else:
+                    doc = Document(record, self._next_id)
+                self._next_id = max(self._next_id, doc.doc_id + 1)
+                docs.append(doc)
+            self._insert_documents(docs)
+            return [doc.doc_id for doc in docs]
+
+    def get(self, doc_id=None, doc_ids=None):
+        if doc_id is not None:
+            return self.shard_of(doc_id).get(doc_id=doc_id)
+        docs = []
+        for i, group in self._group(doc_ids).items():
+            docs.extend(self.shards[i].get(doc_ids=group))
+        return sorted(docs, key=lambda doc: doc.doc_id)
+
+    def all(self):
+        return list(heapq.merge(*(shard.all() for shard in self.shards), key=lambda doc: doc.doc_id))
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def search(self, cond):
+        return list(heapq.merge(*(shard.search(cond) for shard in self.shards), key=lambda doc: doc.doc_id))
+
+    def update(self, fields, doc_ids=None):
+        """Like TinyDB's update(): a dict of fields or a callable editing each document in place."""
+        if doc_ids is None:
+            return [doc_id for shard in self.shards for doc_id in shard.update(fields)]
+        return [doc_id for i, group in self._group(doc_ids).items()
+                for doc_id in self.shards[i].update(fields, doc_ids=group)]
+
+    def remove(self, doc_ids):
+        return [doc_id for i, group in self._group(doc_ids).items()
+                for doc_id in self.shards[i].remove(doc_ids=group)]
+
+    def compact(self, shard):
+        """Rewrite one shard's log as a fresh snapshot; the other shards are not touched."""
+        db = self.shards[shard]
+        db.storage.flush()
+        db.storage.storage.compact()
+
+    def flush(self):
+        for shard in self.shards:
+            shard.storage.flush()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
@@ -0,0 +1,179 @@
+import json
+import sqlite3
+import threading
+
+from tinydb.table import Document
+
+COLUMNS = ('content', 'terms', 'timestamp', 'category', 'file_type', 'encrypted')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT,
+    terms TEXT,
+    timestamp TEXT,
+    category TEXT,
+    file_type TEXT,
+    encrypted INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_category ON documents (category, timestamp);
+CREATE INDEX IF NOT EXISTS documents_timestamp ON documents (timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (terms);
+"""
+
+
+def fts_text(terms):
+    # The stored token bag, spelled out so FTS5 sees every occurrence; the content itself may be encrypted
+    return ' '.join(term for term, tf in (terms or {}).items() for _ in range(tf))
+
+
+def fts_query(tokens):
+    return ' OR '.join('"{}"'.format(token.replace('"', '""')) for token in dict.fromkeys(tokens))
+
+
+class SQLiteStore:
+    """Documents in SQLite (WAL mode) with an FTS5 index over each record's search terms.
+
+    Implements the part of TinyDB's table API that document_manager uses (insert,
+    insert_multiple, get, all, update, remove, iteration and len) and returns tinydb
+    Document objects, so it can stand in for the TinyDB handle. Category and timestamp are
+    real indexed columns; fields without a column of their own round-trip through a JSON
+    `extra` column. search() ranks with FTS5's built-in bm25().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+    def _row(self, record):
+        extra = {key: value for key, value in record.items() if key not in COLUMNS}
+        return (record.get('content'), json.dumps(record['terms']) if 'terms' in record else None,
+                record.get('timestamp'), record.get('category'), record.get('file_type'),
+                int(bool(record.get('encrypted', False))), json.dumps(extra) if extra else None)
+
+    def _document(self, row):
+        doc_id, content, terms, timestamp, category, file_type, encrypted, extra = row
+        record = {key: value for key, value in (('content', content), ('timestamp', timestamp),
+                                                ('category', category), ('file_type', file_type))
+                  if value is not None}
+        record['encrypted'] = bool(encrypted)
+        if terms is not None:
+            record['terms'] = json.loads(terms)
+        if extra:
+            record.update(json.loads(extra))
+        return Document(record, doc_id)
+
+    def _write(self, doc_id, record):
+        row = self._row(record)
+        if doc_id is None:
+            cursor = self.conn.execute(
+                'INSERT INTO documents (content, terms, timestamp, category, file_type, encrypted, extra) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+            doc_id = cursor.lastrowid
+        else:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO documents (doc_id, content, terms, timestamp, category, file_type, encrypted, '
+                'extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (doc_id,) + row)
+            self.conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (doc_id,))
+        self.conn.execute('INSERT INTO documents_fts (rowid, terms) VALUES (?, ?)',
+                          (doc_id, fts_text(record.get('terms'))))
+        return doc_id
+
+    def insert(self, record):
+        return self.insert_multiple([record])[0]
+
+    def insert_multiple(self, records):
+        """Insert in one transaction; Documents keep their doc_id (as TinyDB does), so imports preserve ids."""
+        with self._lock, self.conn:
+            return [self._write(record.doc_id if isinstance(record, Document) else None, record)
+                    for record in records]
+
+    def _select(self, where='', params=()):
+        return [self._document(row) for row in self.conn.execute(
+            'SELECT doc_id, content, terms, timestamp, category, file_type, encrypted, extra '
+            f'FROM documents {where}', params)]
+
+    def get(self, doc_id=None, doc_ids=None):
+        with self._lock:
+            if doc_id is not None:
+                docs = self._select('WHERE doc_id = ?', (doc_id,))
+                return docs[0] if docs else None
+            docs = []
+            doc_ids = list(doc_ids)
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                docs.extend(self._select(f"WHERE doc_id IN ({', '.join('?' * len(batch))})", batch))
+            return docs
+
+    def all(self):
+        with self._lock:
+            return self._select('ORDER BY doc_id')
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def filter(self, category=None, since=None, until=None):
+        """Documents by category and/or ISO timestamp range, served from the column indexes."""
+        clauses, params = [], []
+        if category is not None:
+            clauses.append('category = ?')
+            params.append(category)
+        if since is not None:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('timestamp < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        with self._lock:
+            return self._select(where + 'ORDER BY timestamp', params)
+
+    def update(self, fields, doc_ids=None):
+        """Apply a dict of fields, or a callable editing each document in place, in one transaction."""
+        with self._lock, self.conn:
+            docs = self.all() if doc_ids is None else self.get(doc_ids=doc_ids)
+            for doc in docs:
+                if callable(fields):
+                    fields(doc)
+                else:
+                    doc.update(fields)
+                self._write(doc.doc_id, doc)
+            return [doc.doc_id for doc in docs]
+
+    def remove(self, doc_ids):
+        with self._lock, self.conn:
+            for doc_id in doc_ids:
+                self.conn.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
+                self.conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (doc_id,))
+            return list(doc_ids)
+
+    def search(self, tokens, k=10):
+        """Top-k (doc_id, score) by FTS5 bm25() over the stored terms; higher scores are better."""
+        if not tokens:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT rowid, bm25(documents_fts) AS rank FROM documents_fts WHERE documents_fts MATCH ? '
+                'ORDER BY rank, rowid LIMIT ?', (fts_query(tokens), k)).fetchall()
+        return [(doc_id, -rank) for doc_id, rank in rows]
+
+    def vacuum(self):
+        """Merge the FTS5 index and rewrite the file, so removed rows and terms do not linger on disk."""
+        with self._lock:
+            with self.conn:
+                self.conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+            self.conn.execute('VACUUM')
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
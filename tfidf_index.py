@@ -0,0 +1,186 @@
+import math
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+
+class TfidfIndex:
+    """Sparse TF-IDF document-term matrix (CSR) scored with sparse mat-vec / mat-mat products.
+
+    Rows hold sublinear term weights (1 + log tf); idf is applied on the query side, so adding
+    or deleting a document only touches its own row and the document-frequency vector. New
+    rows are buffered and merged into the CSR matrix on the next query, deleted rows are
+    tombstoned and compacted away once they make up half of the matrix. Row norms depend on
+    idf, so they are recomputed lazily in one vectorized pass after a write.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.row_ids = []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.df = np.zeros(0, dtype=np.int64)
+        self.pending = {}
+        self.dead = 0
+        self._norms = None
+        self._idf = None
+
+    def __len__(self):
+        return len(self.rows) + len(self.pending)
+
+    def _term_columns(self, term_freqs, grow=False):
+        cols, weights = [], []
+        for term, tf in term_freqs.items():
+            col = self.vocabulary.get(term)
+            if col is None:
+                if not grow:
+                    continue
+                col = self.vocabulary[term] = len(self.vocabulary)
+            cols.append(col)
+            weights.append(1 + math.log(tf))
+        return np.array(cols, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+    def _grow_df(self):
+        if len(self.vocabulary) > len(self.df):
+            df = np.zeros(max(len(self.vocabulary), 2 * len(self.df)), dtype=np.int64)
+            df[:len(self.df)] = self.df
+            self.df = df
+
+    def _invalidate(self):
+        self._norms = None
+        self._idf = None
+
+    def add(self, doc_id, term_freqs):
+        self.remove(doc_id)
+        cols, weights = self._term_columns(term_freqs, grow=True)
+        self._grow_df()
+        self.df[cols] += 1
+        self.pending[doc_id] = (cols, weights)
+        self._invalidate()
+
+    def remove(self, doc_id):
+        if doc_id in self.pending:
+            cols, _ = self.pending.pop(doc_id)
+        elif doc_id in self.rows:
+            row = self.rows.pop(doc_id)
+            self.alive[row] = False
+            self.dead += 1
+            cols = self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]]
+        else:
+            return
+        self.df[cols] -= 1
+        self._invalidate()
+
+    def update(self, doc_id, term_freqs):
+        self.add(doc_id, term_freqs)
+
+    def _merge(self):
+        num_terms = len(self.vocabulary)
+        if self.matrix.shape[1] != num_terms:
+            self.matrix.resize((self.matrix.shape[0], num_terms))
+        if self.pending:
+            indptr = np.zeros(len(self.pending) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(cols) for cols, _ in self.pending.values()])
+            indices = np.concatenate([cols for cols, _ in self.pending.values()])
+            data = np.concatenate([weights for _, weights in self.pending.values()])
+            new_rows = sparse.csr_matrix((data, indices, indptr), shape=(len(self.pending), num_terms))
+            start = self.matrix.shape[0]
+            self.matrix = sparse.vstack([self.matrix, new_rows], format='csr')
+            for offset, doc_id in enumerate(self.pending):
+                self.rows[doc_id] = start + offset
+                self.row_ids.append(doc_id)
+            self.alive = np.concatenate([self.alive, np.ones(len(self.pending), dtype=bool)])
+            self.pending = {}
+        if self.dead and self.dead * 2 >= self.matrix.shape[0]:
+            keep = np.flatnonzero(self.alive)
+            self.matrix = self.matrix[keep]
+            self.row_ids = [self.row_ids[row] for row in keep]
+            self.rows = {doc_id: row for row, doc_id in enumerate(self.row_ids)}
+            self.alive = np.ones(len(keep), dtype=bool)
+            self.dead = 0
+
+    def _prepare(self):
+        self._merge()
+        if self._idf is None:
+            num_docs = len(self.rows)
+            df = self.df[:len(self.vocabulary)]
+            self._idf = (np.log((1 + num_docs) / (1 + df)) + 1).astype(np.float32)
+            norms = np.sqrt(self.matrix.power(2) @ (self._idf ** 2))
+            norms[norms == 0] = 1
+            self._norms = norms
+
+    def _query_matrix(self, queries):
+        indptr = [0]
+        indices, data = [], []
+        for term_freqs in queries:
+            if not isinstance(term_freqs, dict):
+                term_freqs = Counter(term_freqs)
+            cols, weights = self._term_columns(term_freqs)
+            indices.append(cols)
+            data.append(weights * self._idf[cols] ** 2)
+            indptr.append(indptr[-1] + len(cols))
+        return sparse.csr_matrix(
+            (np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+             np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+             np.array(indptr)),
+            shape=(len(queries), len(self.vocabulary)))
+
+    def _top_k(self, rows, scores, k):
+        keep = self.alive[rows]
+        rows, scores = rows[keep], scores[keep] / self._norms[rows[keep]]
+        if k is not None and len(scores) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[part], scores[part]
+        order = np.argsort(-scores, kind='stable')
+        return [(self.row_ids[row], float(score)) for row, score in zip(rows[order], scores[order])]
+
+    def search(self, query_terms, k=10):
+        """Score one query (tokens or a {term: tf} bag) with a single sparse mat-vec."""
+        return self.search_batch([query_terms], k)[0]
+
+    def search_batch(self, queries, k=10):
+        """Score many queries with one sparse mat-mat product; returns a ranked list per query."""
+        self._prepare()
+        if not queries:
+            return []
+        scores = (self.matrix @ self._query_matrix(queries).T).tocsc()
+        results = []
+        for j in range(len(queries)):
+            start, end = scores.indptr[j], scores.indptr[j + 1]
+            results.append(self._top_k(scores.indices[start:end], scores.data[start:end], k))
+        return results
+
+    @classmethod
+    def from_inverted_index(cls, index):
+        """Build the matrix in one pass from an InvertedIndex's postings."""
+        doc_ids = sorted(index.doc_lengths)
+        rows = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        vocabulary = {}
+        row_idx, col_idx, tfs = [], [], []
+        for col, (term, postings) in enumerate(index.postings.items()):
+            vocabulary[term] = col
+            for doc_id, tf in postings.items():
+                row_idx.append(rows[doc_id])
+                col_idx.append(col)
+                tfs.append(tf)
+        counts = sparse.csr_matrix(
+            (np.array(tfs, dtype=np.float32), (np.array(row_idx, dtype=np.int64), np.array(col_idx, dtype=np.int64))),
+            shape=(len(doc_ids), len(vocabulary)))
+        return cls.from_counts(counts, doc_ids, vocabulary)
+
+    @classmethod
+    def from_counts(cls, counts, doc_ids, vocabulary):
+        """Build from a (documents x terms) sparse matrix of raw term counts."""
+        tfidf = cls()
+        tfidf.vocabulary = dict(vocabulary)
+        matrix = sparse.csr_matrix(counts, dtype=np.float32)
+        matrix.sum_duplicates()
+        matrix.data = 1 + np.log(matrix.data)
+        tfidf.matrix = matrix
+        tfidf.row_ids = list(doc_ids)
+        tfidf.rows = {doc_id: row for row, doc_id in enumerate(tfidf.row_ids)}
+        tfidf.alive = np.ones(len(tfidf.row_ids), dtype=bool)
+        tfidf.df = np.bincount(matrix.indices, minlength=len(tfidf.vocabulary)).astype(np.int64)
+        return tfidf
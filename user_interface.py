@@ -83,6 +83,17 @@ async def show_message(stdscr, title, message):
     stdscr.refresh()
     stdscr.getch()
 
+def show_progress(stdscr, title, done, total):
+    # Redraws in place without waiting for a key, so it can be used as a progress callback
+    stdscr.clear()
+    height, width = stdscr.getmaxyx()
+    bar_width = max(10, min(50, width - 20))
+    filled = bar_width * done // total if total else bar_width
+    bar = f"[{'#' * filled}{'.' * (bar_width - filled)}] {done}/{total}"
+    safe_addstr(stdscr, height//2 - 2, max(0, (width - len(title))//2), title, curses.A_BOLD)
+    safe_addstr(stdscr, height//2, max(0, (width - len(bar))//2), bar)
+    stdscr.refresh()
+
 async def get_confirmation(stdscr, title, message):
     stdscr.clear()
     height, width = stdscr.getmaxyx()
@@ -119,10 +130,12 @@ async def select_document(stdscr, documents, title):
         safe_addstr(stdscr, 0, max(0, (width - len(title)) // 2), title, curses.A_BOLD)
 
         for idx, doc in enumerate(documents[start_idx:start_idx+max_display], start=start_idx):
+            # Only the visible page is rendered, so only its previews are ever decrypted
+            preview = (doc.get('preview') or doc['content'])[:50]
             if idx == current_idx:
-                safe_addstr(stdscr, idx-start_idx+2, 2, f"> {doc['content'][:50]}...", curses.A_REVERSE)
+                safe_addstr(stdscr, idx-start_idx+2, 2, f"> {preview}...", curses.A_REVERSE)
             else:
-                safe_addstr(stdscr, idx-start_idx+2, 2, f"  {doc['content'][:50]}...")
+                safe_addstr(stdscr, idx-start_idx+2, 2, f"  {preview}...")
 
         safe_addstr(stdscr, height-1, 2, "Use arrow keys to navigate, Enter to select, 'q' to quit")
         stdscr.refresh()
@@ -0,0 +1,79 @@
+import atexit
+import logging
+import threading
+
+from tinydb.middlewares import Middleware
+
+from config import DB_FLUSH_EVERY, DB_FLUSH_INTERVAL_MS, DB_FSYNC
+
+
+class WriteBehindMiddleware(Middleware):
+    """TinyDB middleware that acknowledges writes from memory and hands them to the storage later.
+
+    Reads are served from the buffered state, so a write is visible immediately. The
+    buffer is flushed to the wrapped storage after `flush_every` writes, `interval_ms`
+    after the first unflushed write, on flush(), and at interpreter exit; 0 disables the
+    count or timer trigger. With `fsync`, every flush ends with the storage's sync(), so
+    a flush is a durability point. Several buffered writes to the same document reach the
+    storage as one change.
+
+    Use as TinyDB(DB_FILE, storage=WriteBehindMiddleware(AppendLogStorage)).
+    """
+
+    def __init__(self, storage_cls, flush_every=DB_FLUSH_EVERY, interval_ms=DB_FLUSH_INTERVAL_MS, fsync=DB_FSYNC):
+        super().__init__(storage_cls)
+        self.flush_every = flush_every
+        self.interval_ms = interval_ms
+        self.fsync = fsync
+        self.pending = 0
+        self._data = None
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def __call__(self, *args, **kwargs):
+        super().__call__(*args, **kwargs)
+        atexit.register(self.flush)
+        return self
+
+    def read(self):
+        with self._lock:
+            if self._data is None:
+                self._data = self.storage.read() or {}
+            return dict(self._data)
+
+    def write(self, data):
+        with self._lock:
+            self._data = data
+            self.pending += 1
+            if self.flush_every and self.pending >= self.flush_every:
+                self.flush()
+            elif self.interval_ms and self._timer is None:
+                self._timer = threading.Timer(self.interval_ms / 1000, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Error flushing buffered writes: {str(e)}")
+
+    def flush(self):
+        """Write buffered changes through to the storage (and fsync it when configured)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pending:
+                return
+            self.storage.write(self._data)
+            # Re-read so the buffer shares the storage's document objects again
+            self._data = self.storage.read() or {}
+            self.pending = 0
+            if self.fsync and hasattr(self.storage, 'sync'):
+                self.storage.sync()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self.storage.close()